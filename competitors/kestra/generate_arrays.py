@@ -1,7 +1,12 @@
+import json
 import pandas as pd
 import sys
 import os
 
+# The statistics shared by the analyzers are in the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from timing_stats import timing_distribution, write_distribution, write_histogram
+
 def process_csv(file_path):
     try:
         df = pd.read_csv(file_path)
@@ -73,52 +78,49 @@ def create_markdown_table(df, input_file):
 
 def create_stats_file(df, base_name):
     """
-    Create a stats.md file with performance statistics
+    Create a stats.md file with performance statistics, and the same statistics in stats.json
     """
     filename = f"stats-{base_name}.md"
 
     total_tasks = len(df)
-    first_task_created = df["relative_created"].iloc[0]
-    last_task_completed = df["relative_completed"].iloc[-1]
-    total_duration = last_task_completed
-
-    execution_times = (df["Success Time"] - df["Started Time"]).dt.total_seconds()
-    avg_execution_time = execution_times.mean()
-    total_execution_time = execution_times.sum()
-    execution_percentage = (total_execution_time / total_duration) * 100
-
-    assignment_times = (df["Started Time"] - df["Created Time"]).dt.total_seconds()
-    avg_assignment_time = assignment_times.mean()
-    total_assignment_time = assignment_times.sum()
-    assignment_percentage = (total_assignment_time / total_duration) * 100
-
-    transition_times = []
-    for i in range(total_tasks - 1):
-        current_task_end = df["relative_completed"].iloc[i]
-        next_task_created = df["relative_created"].iloc[i+1]
-        transition_time = next_task_created - current_task_end
-        transition_times.append(transition_time)
-
-    avg_transition_time = sum(transition_times) / (total_tasks - 1) if transition_times else 0
-    total_transition_time = sum(transition_times)
-    transition_percentage = (total_transition_time / total_duration) * 100 if transition_times else 0
+    total_duration = df["relative_completed"].iloc[-1]
+
+    times = {
+        "execution": (df["Success Time"] - df["Started Time"]).dt.total_seconds().to_numpy(),
+        "assignment": (df["Started Time"] - df["Created Time"]).dt.total_seconds().to_numpy(),
+        # from the end of a task to the creation of the next one
+        "transition": (df["relative_created"].shift(-1) - df["relative_completed"]).dropna().to_numpy(),
+    }
+    descriptions = {
+        "execution": "The time it takes for the orchestrator to execute the task once it has been assigned to an executor",
+        "assignment": "The time it takes for a task to be assigned to an executor once it has been created in the queue",
+        "transition": "The time it takes to create the following task once a task is finished",
+    }
+    stats = {
+        "total_tasks": total_tasks,
+        "total_duration": float(total_duration),
+        **{name: timing_distribution(values, total_duration) for name, values in times.items()},
+    }
+
+    with open(f"stats-{base_name}.json", 'w') as f:
+        json.dump(stats, f, indent=4)
 
     with open(filename, 'w') as f:
         f.write("# Performance Statistics\n\n")
 
         f.write(f"## Total Duration: {total_duration:.3f}s\n\n")
 
-        f.write("## Average Times\n\n")
-        f.write(f"- **Execution time**: {avg_execution_time:.3f}s ({execution_percentage:.2f}% of total)\n")
-        f.write("  - The time it takes for the orchestrator to execute the task once it has been assigned to an executor\n\n")
-
-        f.write(f"- **Assignment time**: {avg_assignment_time:.3f}s ({assignment_percentage:.2f}% of total)\n")
-        f.write("  - The time it takes for a task to be assigned to an executor once it has been created in the queue\n\n")
+        f.write("## Times\n\n")
+        for name in times:
+            write_distribution(f, name, stats[name])
+            f.write(f"  - {descriptions[name]}\n\n")
 
-        f.write(f"- **Transition time**: {avg_transition_time:.3f}s ({transition_percentage:.2f}% of total)\n")
-        f.write("  - The time it takes to create the following task once a task is finished\n\n")
+        f.write("## Histograms\n")
+        for name in times:
+            if stats[name]["histogram"]:
+                write_histogram(f, name, stats[name]["histogram"])
 
-        f.write(f"Total tasks analyzed: {total_tasks}\n")
+        f.write(f"\nTotal tasks analyzed: {total_tasks}\n")
 
     print(f"Created stats file: {filename}")
 
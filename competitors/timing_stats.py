@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import numpy as np
+
+HISTOGRAM_BINS = 10
+
+
+def load_benchmarks(file_path):
+    # The timing JSON files of the analyzers: {"python": [{...}]} for windmill and hatchet, and
+    # {"usecases": {<usecase>: {<language>: {...}}}} for temporal
+    with open(file_path, 'r') as f:
+        data = json.load(f)
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    if "usecases" in data:
+        return [
+            (f"{base_name}-{usecase}-{language}", timings)
+            for usecase, usecase_data in data["usecases"].items()
+            for language, timings in usecase_data.items()
+            if isinstance(timings, dict)
+        ]
+    benchmarks = [
+        (f"{base_name}-{language}", timings)
+        for language, language_timings in data.items()
+        for timings in language_timings
+    ]
+    if len(benchmarks) > 1:
+        benchmarks = [(f"{name}-{index}", timings) for index, (name, timings) in enumerate(benchmarks)]
+    return benchmarks
+
+
+def timing_distribution(times, total_duration):
+    # Averages hide the queueing spikes, the tail of the distribution is reported along with a histogram
+    if not len(times):
+        return {"avg": 0, "total": 0, "percentage": 0, "p50": 0, "p90": 0, "p99": 0, "max": 0, "histogram": None}
+    p50, p90, p99 = np.percentile(times, [50, 90, 99])
+    counts, edges = np.histogram(times, bins=HISTOGRAM_BINS)
+    return {
+        "avg": float(times.mean()),
+        "total": float(times.sum()),
+        "percentage": float(times.sum() / total_duration * 100) if total_duration else 0,
+        "p50": float(p50),
+        "p90": float(p90),
+        "p99": float(p99),
+        "max": float(times.max()),
+        "histogram": {"edges": edges.round(3).tolist(), "counts": counts.tolist()},
+    }
+
+
+def write_distribution(f, name, distribution):
+    f.write(
+        f"- **{name.capitalize()} time**: {distribution['avg']:.3f}s ({distribution['percentage']:.2f}%), "
+        f"p50 {distribution['p50']:.3f}s, p90 {distribution['p90']:.3f}s, p99 {distribution['p99']:.3f}s, "
+        f"max {distribution['max']:.3f}s\n"
+    )
+
+
+def write_histogram(f, name, histogram):
+    f.write(f"\n### {name.capitalize()} time\n\n")
+    f.write("| **From** | **To** | **Tasks** | |\n")
+    f.write("| -------: | -----: | --------: | :- |\n")
+    largest = max(histogram["counts"]) or 1
+    for low, high, count in zip(histogram["edges"], histogram["edges"][1:], histogram["counts"]):
+        f.write(f"| {low:.3f}s | {high:.3f}s | {count} | {'#' * round(count / largest * 40)} |\n")
+
+
+def compute_stats(timings):
+    created_at = np.asarray(timings["created_at"], dtype=float)
+    started_at = np.asarray(timings["started_at"], dtype=float)
+    completed_at = np.asarray(timings["completed_at"], dtype=float)
+    total_duration = float(completed_at.max()) if len(completed_at) else 0
+
+    times = {
+        "execution": completed_at - started_at,
+        "assignment": started_at - created_at,
+        # from the end of a task to the creation of the next one
+        "transition": created_at[1:] - completed_at[:-1],
+    }
+    stats = {
+        "workers_count": timings.get("workers", 1),
+        "total_tasks": len(created_at),
+        "total_duration": total_duration,
+        **{name: timing_distribution(values, total_duration) for name, values in times.items()},
+        "workers": [],
+    }
+
+    if "worker_execution" in timings:
+        worker_execution = np.asarray(timings["worker_execution"])
+        for worker in np.unique(worker_execution):
+            tasks = worker_execution == worker
+            stats["workers"].append({
+                "worker": int(worker),
+                "tasks": int(tasks.sum()),
+                "execution": timing_distribution(times["execution"][tasks], total_duration),
+                "assignment": timing_distribution(times["assignment"][tasks], total_duration),
+            })
+    return stats
+
+
+def create_stats_files(name, stats):
+    with open(f"stats-{name}.json", 'w') as f:
+        json.dump(stats, f, indent=4)
+
+    with open(f"stats-{name}.md", 'w') as f:
+        f.write("# Performance Statistics\n\n")
+        f.write(f"## Total Duration: {stats['total_duration']:.3f}s\n\n")
+        f.write("## Times\n\n")
+        for metric in ["execution", "assignment", "transition"]:
+            write_distribution(f, metric, stats[metric])
+
+        f.write("\n## Histograms\n")
+        for metric in ["execution", "assignment", "transition"]:
+            if stats[metric]["histogram"]:
+                write_histogram(f, metric, stats[metric]["histogram"])
+
+        if len(stats["workers"]) > 1:
+            f.write("\n## Workers\n\n")
+            f.write("| **Worker** | **Tasks** | **Execution p50** | **Execution p99** | **Assignment p50** | **Assignment p99** | **Assignment max** |\n")
+            f.write("| ---------: | --------: | ----------------: | ----------------: | -----------------: | -----------------: | -----------------: |\n")
+            for worker in stats["workers"]:
+                execution, assignment = worker["execution"], worker["assignment"]
+                f.write(
+                    f"| {worker['worker']} | {worker['tasks']} | {execution['p50']:.3f}s | {execution['p99']:.3f}s "
+                    f"| {assignment['p50']:.3f}s | {assignment['p99']:.3f}s | {assignment['max']:.3f}s |\n"
+                )
+        f.write(f"\nTotal tasks analyzed: {stats['total_tasks']}\n")
+
+    return f"stats-{name}.md", f"stats-{name}.json"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Tail statistics (p50, p90, p99, max, histograms, per worker) of the timing JSON files"
+    )
+    parser.add_argument("files", nargs="+", help="Timing JSON files of the windmill, hatchet or temporal analyzers")
+    args = parser.parse_args()
+
+    for file_path in args.files:
+        for name, timings in load_benchmarks(file_path):
+            stats_file, json_file = create_stats_files(name, compute_stats(timings))
+            print(f"Created {stats_file} and {json_file}")
+
+
+if __name__ == "__main__":
+    main()
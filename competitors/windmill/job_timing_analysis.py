@@ -2,10 +2,20 @@
 import argparse
 import psycopg2
 import json
+import numpy as np
 import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shutil
+import sys
+import tempfile
 from datetime import datetime
 from psycopg2.extras import RealDictCursor
 
+# The statistics shared by the analyzers are in the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from timing_stats import timing_distribution, write_distribution, write_histogram
+
 
 def query_job_data(parent_job_id, conn_string, workers=1):
     print(f"Using connection string: {conn_string}")
@@ -179,51 +189,516 @@ def create_stats_file(relative_timings, parent_job_id):
         print("No tasks to analyze")
         return filename
 
-    first_task_created = relative_timings[0]['created_at']
-    last_task_started = relative_timings[-1]['started_at']
-    last_task_completed = relative_timings[-1]['completed_at']
-    total_duration = last_task_completed
+    created_at = np.array([t['created_at'] for t in relative_timings])
+    started_at = np.array([t['started_at'] for t in relative_timings])
+    completed_at = np.array([t['completed_at'] for t in relative_timings])
+    total_duration = float(completed_at[-1])
+
+    times = {
+        'execution': completed_at - started_at,
+        'assignment': np.array([t['created_started_diff'] for t in relative_timings]),
+        'transition': created_at[1:] - completed_at[:-1],
+    }
+    stats = {
+        'total_tasks': total_tasks,
+        'total_duration': total_duration,
+        **{name: timing_distribution(values, total_duration) for name, values in times.items()},
+        'workers': [],
+    }
+
+    if 'worker' in relative_timings[0]:
+        workers, worker_index = np.unique(
+            np.array([str(t['worker']) for t in relative_timings]), return_inverse=True
+        )
+        for index, worker in enumerate(workers):
+            tasks = worker_index == index
+            stats['workers'].append({
+                'worker': worker,
+                'tasks': int(tasks.sum()),
+                'execution': timing_distribution(times['execution'][tasks], total_duration),
+                'assignment': timing_distribution(times['assignment'][tasks], total_duration),
+            })
+
+    with open(f"stats-{parent_job_id}.json", 'w') as f:
+        json.dump(stats, f, indent=4)
+
+    with open(filename, 'w') as f:
+        f.write("# Performance Statistics\n\n")
+        f.write(f"## Total Duration: {total_duration:.3f}s\n\n")
+        f.write("## Times\n\n")
+        for name in times:
+            write_distribution(f, name, stats[name])
+        f.write("\n## Histograms\n")
+        for name in times:
+            if stats[name]['histogram']:
+                write_histogram(f, name, stats[name]['histogram'])
+        if len(stats['workers']) > 1:
+            f.write("\n## Workers\n\n")
+            f.write("| **Worker** | **Tasks** | **Execution p50** | **Execution p99** | **Assignment p50** | **Assignment p99** | **Assignment max** |\n")
+            f.write("| :--------- | --------: | ----------------: | ----------------: | -----------------: | -----------------: | -----------------: |\n")
+            for worker in stats['workers']:
+                execution, assignment = worker['execution'], worker['assignment']
+                f.write(
+                    f"| {worker['worker']} | {worker['tasks']} | {execution['p50']:.3f}s | {execution['p99']:.3f}s "
+                    f"| {assignment['p50']:.3f}s | {assignment['p99']:.3f}s | {assignment['max']:.3f}s |\n"
+                )
+        f.write(f"\nTotal tasks analyzed: {total_tasks}\n")
+
+    return filename
+
+
+def tasks_query(workers=1):
+    # Same rows as query_job_data, with the timings relative to the parent job start computed by Postgres, for all the
+    # parent jobs in %(parent_job_ids)s. For multi-worker runs, a task is created when its sub-parent is. The transition
+    # time is the time between the end of a task and the creation of the next one of the same parent job.
+    if workers > 1:
+        tasks = """
+            SELECT sp.parent_job AS root_id, c.id, sp.created_at AS created_at, c.created_at AS job_created_at,
+                c.started_at, c.duration_ms, jc.worker
+            FROM v2_as_completed_job sp
+            JOIN v2_as_completed_job c ON c.parent_job = sp.id
+            LEFT JOIN v2_job_completed jc ON c.id = jc.id
+            WHERE sp.parent_job = ANY(%(parent_job_ids)s::uuid[])
+        """
+    else:
+        tasks = """
+            SELECT c.parent_job AS root_id, c.id, c.created_at, c.created_at AS job_created_at, c.started_at,
+                c.duration_ms, NULL::text AS worker
+            FROM v2_as_completed_job c
+            WHERE c.parent_job = ANY(%(parent_job_ids)s::uuid[])
+        """
+    return f"""
+    WITH parent AS (
+        SELECT id, started_at FROM v2_as_completed_job WHERE id = ANY(%(parent_job_ids)s::uuid[])
+    ),
+    tasks AS ({tasks}),
+    relative_tasks AS (
+        SELECT
+            t.root_id,
+            t.id,
+            t.worker,
+            t.created_at,
+            EXTRACT(EPOCH FROM t.created_at - p.started_at)::float8 AS created_at_rel,
+            EXTRACT(EPOCH FROM t.started_at - p.started_at)::float8 AS started_at_rel,
+            EXTRACT(EPOCH FROM t.started_at - p.started_at)::float8 + t.duration_ms::float8 / 1000 AS completed_at_rel,
+            EXTRACT(EPOCH FROM t.started_at - t.job_created_at)::float8 AS assignment_time,
+            t.duration_ms::float8 / 1000 AS execution_time
+        FROM tasks t
+        JOIN parent p ON p.id = t.root_id
+    )
+    SELECT
+        *,
+        LEAD(created_at_rel) OVER (PARTITION BY root_id ORDER BY created_at, id) - completed_at_rel AS transition_time
+    FROM relative_tasks
+    """
+
+
+# Statistics of a group of tasks from tasks_query
+SUMMARY_COLUMNS = """
+    count(*) AS total_tasks,
+    (array_agg(completed_at_rel ORDER BY created_at DESC, id DESC))[1] AS total_duration,
+    avg(execution_time) AS avg_execution_time,
+    sum(execution_time) AS total_execution_time,
+    percentile_cont(ARRAY[0.5, 0.9, 0.99]) WITHIN GROUP (ORDER BY execution_time) AS execution_time_percentiles,
+    max(execution_time) AS max_execution_time,
+    avg(assignment_time) AS avg_assignment_time,
+    sum(assignment_time) AS total_assignment_time,
+    percentile_cont(ARRAY[0.5, 0.9, 0.99]) WITHIN GROUP (ORDER BY assignment_time) AS assignment_time_percentiles,
+    max(assignment_time) AS max_assignment_time,
+    avg(transition_time) AS avg_transition_time,
+    coalesce(sum(transition_time), 0) AS total_transition_time,
+    percentile_cont(ARRAY[0.5, 0.9, 0.99]) WITHIN GROUP (ORDER BY transition_time) AS transition_time_percentiles,
+    max(transition_time) AS max_transition_time
+"""
+
+
+def query_job_summary(parent_job_id, conn_string, workers=1, per_task=False):
+    # Only the summary (and optionally compact arrays of the task timings) leaves Postgres
+    print(f"Using connection string: {conn_string}")
+
+    with psycopg2.connect(conn_string) as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(
+                f"""
+                WITH timings AS ({tasks_query(workers)})
+                SELECT {SUMMARY_COLUMNS}
+                FROM timings
+                """,
+                {'parent_job_ids': [parent_job_id]},
+            )
+            summary = cur.fetchone()
+            if not summary['total_tasks']:
+                return None, None, None
+
+            cur.execute(
+                f"""
+                WITH timings AS ({tasks_query(workers)})
+                SELECT
+                    worker,
+                    count(*) AS tasks,
+                    sum(execution_time) AS execution_time,
+                    percentile_cont(ARRAY[0.5, 0.99]) WITHIN GROUP (ORDER BY execution_time) AS execution_time_percentiles,
+                    percentile_cont(ARRAY[0.5, 0.99]) WITHIN GROUP (ORDER BY assignment_time) AS assignment_time_percentiles,
+                    max(assignment_time) AS max_assignment_time
+                FROM timings
+                GROUP BY worker
+                ORDER BY worker COLLATE "C"
+                """,
+                {'parent_job_ids': [parent_job_id]},
+            )
+            worker_counts = cur.fetchall()
+
+            tasks = None
+            if per_task:
+                # Same content as create_json_file, the workers are numbered in the order of their ids. The ids are
+                # compared byte by byte as sorted() does, not with the collation of the database
+                cur.execute(
+                    f"""
+                    WITH timings AS ({tasks_query(workers)})
+                    SELECT
+                        array_agg(round(created_at_rel::numeric, 3)::float8 ORDER BY created_at, id) AS created_at,
+                        array_agg(round(started_at_rel::numeric, 3)::float8 ORDER BY created_at, id) AS started_at,
+                        array_agg(round(completed_at_rel::numeric, 3)::float8 ORDER BY created_at, id) AS completed_at,
+                        array_agg(worker_index ORDER BY created_at, id) AS worker_execution
+                    FROM (
+                        SELECT *, dense_rank() OVER (ORDER BY worker COLLATE "C") - 1 AS worker_index FROM timings
+                    ) t
+                    """,
+                    {'parent_job_ids': [parent_job_id]},
+                )
+                tasks = cur.fetchone()
+
+            return summary, worker_counts, tasks
+
 
-    execution_times = [t['completed_at'] - t['started_at'] for t in relative_timings]
-    avg_execution_time = sum(execution_times) / total_tasks
-    total_execution_time = sum(execution_times)
-    execution_percentage = (total_execution_time / total_duration) * 100
+def create_summary_json_file(tasks, parent_job_id, worker_count=None):
+    filename = f"timing-{parent_job_id}.json"
+
+    output = {
+        "python": [{
+            "workers": worker_count or 1,
+            "created_at": tasks['created_at'],
+            "started_at": tasks['started_at'],
+            "completed_at": tasks['completed_at'],
+        }]
+    }
+    if worker_count:
+        output["python"][0]["worker_execution"] = tasks['worker_execution']
+
+    with open(filename, 'w') as f:
+        json.dump(output, f)
 
-    assignment_times = [t['created_started_diff'] for t in relative_timings]
-    avg_assignment_time = sum(assignment_times) / total_tasks
-    total_assignment_time = sum(assignment_times)
-    assignment_percentage = (total_assignment_time / total_duration) * 100
+    return filename
 
-    transition_times = []
-    for i in range(total_tasks - 1):
-        current_end = relative_timings[i]['completed_at']
-        next_created = relative_timings[i + 1]['created_at']
-        transition_times.append(next_created - current_end)
 
-    avg_transition_time = sum(transition_times) / (total_tasks - 1) if transition_times else 0
-    total_transition_time = sum(transition_times)
-    transition_percentage = (total_transition_time / total_duration) * 100 if transition_times else 0
+def create_summary_stats_file(summary, worker_counts, parent_job_id):
+    filename = f"stats-{parent_job_id}.md"
+    total_duration = summary['total_duration']
+
+    stats = {'total_tasks': summary['total_tasks'], 'total_duration': total_duration, 'workers': []}
+    for name in ['execution', 'assignment', 'transition']:
+        p50, p90, p99 = summary[f'{name}_time_percentiles'] or [0, 0, 0]
+        stats[name] = {
+            'avg': summary[f'avg_{name}_time'] or 0,
+            'total': summary[f'total_{name}_time'] or 0,
+            'percentage': (summary[f'total_{name}_time'] / total_duration) * 100 if total_duration else 0,
+            'p50': p50 or 0,
+            'p90': p90 or 0,
+            'p99': p99 or 0,
+            'max': summary[f'max_{name}_time'] or 0,
+            'histogram': None,
+        }
+    for worker in worker_counts:
+        execution_p50, execution_p99 = worker['execution_time_percentiles']
+        assignment_p50, assignment_p99 = worker['assignment_time_percentiles']
+        stats['workers'].append({
+            'worker': worker['worker'],
+            'tasks': worker['tasks'],
+            'execution': {'total': worker['execution_time'], 'p50': execution_p50, 'p99': execution_p99},
+            'assignment': {'p50': assignment_p50, 'p99': assignment_p99, 'max': worker['max_assignment_time']},
+        })
+
+    with open(f"stats-{parent_job_id}.json", 'w') as f:
+        json.dump(stats, f, indent=4)
 
     with open(filename, 'w') as f:
         f.write("# Performance Statistics\n\n")
         f.write(f"## Total Duration: {total_duration:.3f}s\n\n")
-        f.write("## Average Times\n\n")
-        f.write(f"- **Execution time**: {avg_execution_time:.3f}s ({execution_percentage:.2f}%)\n")
-        f.write(f"- **Assignment time**: {avg_assignment_time:.3f}s ({assignment_percentage:.2f}%)\n")
-        f.write(f"- **Transition time**: {avg_transition_time:.3f}s ({transition_percentage:.2f}%)\n")
-        f.write(f"\nTotal tasks analyzed: {total_tasks}\n")
+        f.write("## Times\n\n")
+        for name in ['execution', 'assignment', 'transition']:
+            write_distribution(f, name, stats[name])
+        if len(worker_counts) > 1:
+            f.write("\n## Workers\n\n")
+            f.write("| **Worker** | **Tasks** | **Execution time** | **Execution p50** | **Execution p99** | **Assignment p50** | **Assignment p99** | **Assignment max** |\n")
+            f.write("| :--------- | --------: | -----------------: | ----------------: | ----------------: | -----------------: | -----------------: | -----------------: |\n")
+            for worker in stats['workers']:
+                execution, assignment = worker['execution'], worker['assignment']
+                f.write(
+                    f"| {worker['worker']} | {worker['tasks']} | {execution['total']:.3f}s | {execution['p50']:.3f}s "
+                    f"| {execution['p99']:.3f}s | {assignment['p50']:.3f}s | {assignment['p99']:.3f}s "
+                    f"| {assignment['max']:.3f}s |\n"
+                )
+        f.write(f"\nTotal tasks analyzed: {summary['total_tasks']}\n")
+
+    return filename
+
 
+def stream_job_timings(parent_job_id, conn_string, workers=1, output_format='json', batch_size=10000):
+    # The rows are fetched through a named (server-side) cursor, batch_size at a time, and each batch is written out
+    # before the next one is fetched: the memory used doesn't depend on the number of jobs
+    print(f"Using connection string: {conn_string}")
+    filename = f"timing-{parent_job_id}.{output_format}"
+    columns = ['created_at', 'started_at', 'completed_at', 'worker_execution']
+
+    with psycopg2.connect(conn_string) as conn:
+        with conn.cursor(name='job_timings') as cur, tempfile.TemporaryDirectory() as tmp_dir:
+            cur.itersize = batch_size
+            cur.execute(
+                f"""
+                SELECT created_at_rel, started_at_rel, completed_at_rel, dense_rank() OVER (ORDER BY worker COLLATE "C") - 1
+                FROM ({tasks_query(workers)}) timings
+                ORDER BY created_at, id
+                """,
+                {'parent_job_ids': [parent_job_id]},
+            )
+
+            if output_format == 'parquet':
+                schema = pa.schema([(column, pa.float64()) for column in columns[:3]] + [(columns[3], pa.int32())])
+                writer = pq.ParquetWriter(filename, schema)
+            else:
+                # JSON: each array is written to its own file, and they are concatenated at the end
+                column_files = {column: open(os.path.join(tmp_dir, column), 'w') for column in columns}
+
+            total_tasks, worker_count = 0, 0
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                batch = np.array(rows, dtype=np.float64)
+                timings = np.round(batch[:, :3], 3)
+                worker_indexes = batch[:, 3].astype(np.int32)
+                worker_count = max(worker_count, int(worker_indexes.max()) + 1)
+
+                if output_format == 'parquet':
+                    writer.write_table(pa.Table.from_arrays(
+                        [pa.array(timings[:, i]) for i in range(3)] + [pa.array(worker_indexes)], schema=schema
+                    ))
+                else:
+                    separator = ',' if total_tasks else ''
+                    for i, column in enumerate(columns[:3]):
+                        column_files[column].write(separator + ','.join(map(str, timings[:, i].tolist())))
+                    column_files['worker_execution'].write(separator + ','.join(map(str, worker_indexes.tolist())))
+                total_tasks += len(rows)
+
+            if output_format == 'parquet':
+                writer.close()
+            else:
+                for column_file in column_files.values():
+                    column_file.close()
+                write_compact_json(filename, tmp_dir, columns, worker_count if workers > 1 else 1)
+
+    print(f"Streamed {total_tasks} tasks")
     return filename
 
 
+def write_compact_json(filename, columns_dir, columns, worker_count):
+    # Same content as create_json_file, without indentation
+    with open(filename, 'w') as f:
+        f.write(f'{{"python":[{{"workers":{worker_count}')
+        for column in columns:
+            if column == 'worker_execution' and worker_count <= 1:
+                continue
+            f.write(f',"{column}":[')
+            with open(os.path.join(columns_dir, column)) as column_file:
+                shutil.copyfileobj(column_file, f)
+            f.write(']')
+        f.write('}]}')
+
+
+def find_parent_jobs(cur, since=None, until=None, script_path=None):
+    # Root jobs of the benchmark flows run in the time window, and optionally from a given script or flow path
+    cur.execute(
+        """
+        SELECT id
+        FROM v2_as_completed_job
+        WHERE parent_job IS NULL
+            AND (%(since)s::timestamptz IS NULL OR created_at >= %(since)s::timestamptz)
+            AND (%(until)s::timestamptz IS NULL OR created_at < %(until)s::timestamptz)
+            AND (%(script_path)s::text IS NULL OR script_path = %(script_path)s::text)
+        ORDER BY created_at
+        """,
+        {'since': since, 'until': until, 'script_path': script_path},
+    )
+    return [str(row['id']) for row in cur.fetchall()]
+
+
+def query_batch_summary(parent_job_ids, conn_string, workers=1, since=None, until=None, script_path=None):
+    # All the runs are analyzed on one connection, with one query for the statistics of each run and one for the
+    # statistics of all their tasks together
+    print(f"Using connection string: {conn_string}")
+
+    with psycopg2.connect(conn_string) as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if since or until or script_path:
+                parent_job_ids = parent_job_ids + find_parent_jobs(cur, since, until, script_path)
+            if not parent_job_ids:
+                return None, None
+            print(f"Analyzing {len(parent_job_ids)} runs")
+
+            cur.execute(
+                f"""
+                WITH timings AS ({tasks_query(workers)})
+                SELECT root_id, count(DISTINCT worker) AS workers, {SUMMARY_COLUMNS}
+                FROM timings
+                GROUP BY root_id
+                ORDER BY min(created_at)
+                """,
+                {'parent_job_ids': parent_job_ids},
+            )
+            runs = cur.fetchall()
+
+            cur.execute(
+                f"""
+                WITH timings AS ({tasks_query(workers)})
+                SELECT {SUMMARY_COLUMNS}
+                FROM timings
+                """,
+                {'parent_job_ids': parent_job_ids},
+            )
+            overall = cur.fetchone()
+            return runs, overall
+
+
+def create_batch_report(runs, overall):
+    base_name = f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    durations = [run['total_duration'] for run in runs]
+
+    report = {
+        "runs": [
+            {
+                "parent_job_id": str(run['root_id']),
+                "workers": max(run['workers'], 1),
+                "total_tasks": run['total_tasks'],
+                "total_duration": round(run['total_duration'], 3),
+                **{
+                    f"avg_{name}_time": round(run[f'avg_{name}_time'] or 0, 3)
+                    for name in ['execution', 'assignment', 'transition']
+                },
+            }
+            for run in runs
+        ],
+        "aggregate": {
+            "runs": len(runs),
+            "total_tasks": overall['total_tasks'],
+            "avg_duration": round(sum(durations) / len(durations), 3),
+            "min_duration": round(min(durations), 3),
+            "max_duration": round(max(durations), 3),
+            **{
+                f"avg_{name}_time": round(overall[f'avg_{name}_time'] or 0, 3)
+                for name in ['execution', 'assignment', 'transition']
+            },
+            **{
+                f"{name}_time_percentiles": [round(p or 0, 3) for p in overall[f'{name}_time_percentiles'] or []]
+                for name in ['execution', 'assignment', 'transition']
+            },
+        },
+    }
+    with open(f"{base_name}.json", 'w') as f:
+        json.dump(report, f, indent=4)
+
+    aggregate = report['aggregate']
+    with open(f"{base_name}.md", 'w') as f:
+        f.write("# Performance Statistics\n\n")
+        f.write(f"## {aggregate['runs']} runs, {aggregate['total_tasks']} tasks\n\n")
+        f.write(
+            f"- **Duration**: {aggregate['avg_duration']:.3f}s on average, "
+            f"from {aggregate['min_duration']:.3f}s to {aggregate['max_duration']:.3f}s\n"
+        )
+        for name in ['execution', 'assignment', 'transition']:
+            p50, p90, p99 = aggregate[f'{name}_time_percentiles'] or [0, 0, 0]
+            f.write(
+                f"- **{name.capitalize()} time**: {aggregate[f'avg_{name}_time']:.3f}s, "
+                f"p50 {p50:.3f}s, p90 {p90:.3f}s, p99 {p99:.3f}s\n"
+            )
+        f.write("\n## Runs\n\n")
+        f.write("| **Parent job** | **Workers** | **Tasks** | **Duration** | **Execution** | **Assignment** | **Transition** |\n")
+        f.write("| :------------- | ----------: | --------: | -----------: | ------------: | -------------: | -------------: |\n")
+        for run in report['runs']:
+            f.write(
+                f"| {run['parent_job_id']} | {run['workers']} | {run['total_tasks']} | {run['total_duration']:.3f}s "
+                f"| {run['avg_execution_time']:.3f}s | {run['avg_assignment_time']:.3f}s "
+                f"| {run['avg_transition_time']:.3f}s |\n"
+            )
+
+    return f"{base_name}.json", f"{base_name}.md"
+
+
 def main():
     parser = argparse.ArgumentParser(description='Analyze Windmill job timings')
-    parser.add_argument('parent_job_id', help='Parent job ID')
+    parser.add_argument('parent_job_id', nargs='*', help='Parent job ID, several ones to analyze them as a batch')
     parser.add_argument('--conn-string', required=True, help='PostgreSQL connection string')
     parser.add_argument('--workers', type=int, default=1, help='Number of workers')
+    parser.add_argument('--aggregate', action='store_true',
+                        help='Compute the statistics in Postgres instead of fetching every job')
+    parser.add_argument('--per-task', action='store_true',
+                        help='With --aggregate, also write the timings of each task to the JSON file')
+    parser.add_argument('--stream', choices=['json', 'parquet'],
+                        help='Stream the timings of each task to a compact JSON or a parquet file')
+    parser.add_argument('--batch-size', type=int, default=10000, help='Rows fetched at once with --stream')
+    parser.add_argument('--parents-file', help='File with one parent job ID per line, analyzed as a batch')
+    parser.add_argument('--since', help='Analyze the root jobs created after this time, e.g. 2025-01-01T00:00:00Z')
+    parser.add_argument('--until', help='Analyze the root jobs created before this time')
+    parser.add_argument('--script-path', help='Only analyze the root jobs of this script or flow path')
 
     args = parser.parse_args()
 
+    parent_job_ids = list(args.parent_job_id)
+    if args.parents_file:
+        with open(args.parents_file, 'r') as f:
+            parent_job_ids.extend(line.strip() for line in f if line.strip())
+    if len(parent_job_ids) > 1 or args.since or args.until or args.script_path:
+        runs, overall = query_batch_summary(
+            parent_job_ids, args.conn_string, args.workers, args.since, args.until, args.script_path
+        )
+        if not runs:
+            print("No matching job data found.")
+            return
+        json_file, stats_file = create_batch_report(runs, overall)
+        print(f"Analysis complete.\n- JSON:  {json_file}\n- Stats: {stats_file}")
+        return
+    if not parent_job_ids:
+        parser.error('a parent job ID, --parents-file, --since, --until or --script-path is required')
+    args.parent_job_id = parent_job_ids[0]
+
+    if args.stream and not args.aggregate:
+        timings_file = stream_job_timings(
+            args.parent_job_id, args.conn_string, args.workers, args.stream, args.batch_size
+        )
+        print(f"Analysis complete.\n- Timings: {timings_file}")
+        return
+
+    if args.aggregate:
+        summary, worker_counts, tasks = query_job_summary(
+            args.parent_job_id, args.conn_string, args.workers, args.per_task and not args.stream
+        )
+        if not summary:
+            print("No matching job data found.")
+            return
+
+        stats_file = create_summary_stats_file(summary, worker_counts, args.parent_job_id)
+        print(f"Analysis complete.\n- Stats: {stats_file}")
+        if args.stream:
+            timings_file = stream_job_timings(
+                args.parent_job_id, args.conn_string, args.workers, args.stream, args.batch_size
+            )
+            print(f"- Timings: {timings_file}")
+        elif tasks:
+            json_file = create_summary_json_file(
+                tasks, args.parent_job_id, len(worker_counts) if args.workers > 1 else None
+            )
+            print(f"- JSON:  {json_file}")
+        return
+
     try:
         job_data, parent_job = query_job_data(args.parent_job_id, args.conn_string, args.workers)
         if not job_data:
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import numpy as np
+from timing_stats import load_benchmarks
+
+SVG_WIDTH = 1000
+ROW_HEIGHT = 20
+CONCURRENCY_HEIGHT = 100
+MARGIN = 60
+
+
+def busy_intervals(started_at, completed_at):
+    # Merges the tasks of a worker that overlap: a new busy interval starts when a task starts after all the previous
+    # ones are completed
+    order = np.argsort(started_at, kind="stable")
+    starts = started_at[order]
+    ends = np.maximum.accumulate(completed_at[order])
+    new_interval = np.concatenate(([True], starts[1:] > ends[:-1]))
+    last_of_interval = np.concatenate((new_interval[1:], [True]))
+    return starts[new_interval], ends[last_of_interval]
+
+
+def concurrency_timeline(started_at, completed_at):
+    # Sweep over the starts (+1) and the completions (-1) of all the tasks, the completions sorted first on ties so
+    # that back to back tasks don't count as concurrent
+    times = np.concatenate((started_at, completed_at))
+    deltas = np.concatenate((np.ones(len(started_at), dtype=int), -np.ones(len(completed_at), dtype=int)))
+    order = np.lexsort((deltas, times))
+    return times[order], np.cumsum(deltas[order])
+
+
+def compute_utilization(timings):
+    created_at = np.asarray(timings["created_at"], dtype=float)
+    started_at = np.asarray(timings["started_at"], dtype=float)
+    completed_at = np.asarray(timings["completed_at"], dtype=float)
+    worker_execution = np.asarray(timings.get("worker_execution", np.zeros(len(started_at), dtype=int)))
+    window_start, window_end = float(created_at.min()), float(completed_at.max())
+    window = window_end - window_start
+
+    workers = []
+    for worker in np.unique(worker_execution):
+        tasks = worker_execution == worker
+        starts, ends = busy_intervals(started_at[tasks], completed_at[tasks])
+        busy = float((ends - starts).sum())
+        # the gaps between the busy intervals, and before the first one and after the last one
+        gaps = np.concatenate(([starts[0] - window_start], starts[1:] - ends[:-1], [window_end - ends[-1]]))
+        inner_gaps = gaps[1:-1]
+        times, concurrency = concurrency_timeline(started_at[tasks], completed_at[tasks])
+        workers.append({
+            "worker": int(worker),
+            "tasks": int(tasks.sum()),
+            "busy": busy,
+            "utilization": busy / window * 100 if window else 0,
+            "idle_gaps": len(inner_gaps),
+            "idle_gaps_total": float(inner_gaps.sum()),
+            "idle_gaps_p90": float(np.percentile(inner_gaps, 90)) if len(inner_gaps) else 0,
+            "idle_gap_max": float(gaps.max()),
+            "first_start": float(starts[0]),
+            "last_completion": float(ends[-1]),
+            "max_concurrency": int(concurrency.max()),
+            "busy_intervals": np.column_stack((starts, ends)).round(3).tolist(),
+        })
+
+    times, concurrency = concurrency_timeline(started_at, completed_at)
+    busy = np.array([worker["busy"] for worker in workers])
+    tasks = np.array([worker["tasks"] for worker in workers])
+    return {
+        "workers_count": timings.get("workers", 1),
+        "total_tasks": len(started_at),
+        "window_start": window_start,
+        "window": window,
+        "max_concurrency": int(concurrency.max()),
+        # average number of tasks running at the same time
+        "avg_concurrency": float((completed_at - started_at).sum() / window) if window else 0,
+        "utilization": float(busy.sum() / (window * len(workers)) * 100) if window else 0,
+        # 1.0 when the work is evenly spread, the busiest worker is that much busier than the average one
+        "busy_imbalance": float(busy.max() / busy.mean()) if busy.mean() else 0,
+        "tasks_imbalance": float(tasks.max() / tasks.mean()),
+        "workers": workers,
+        "concurrency": {"times": times.round(3).tolist(), "running": concurrency.tolist()},
+    }
+
+
+def create_gantt_svg(name, utilization):
+    filename = f"utilization-{name}.svg"
+    workers = utilization["workers"]
+    window_start = utilization["window_start"]
+    window = utilization["window"] or 1
+    height = MARGIN * 2 + ROW_HEIGHT * len(workers) + CONCURRENCY_HEIGHT
+
+    def x(time):
+        return MARGIN + (time - window_start) / window * (SVG_WIDTH - MARGIN * 2)
+
+    with open(filename, 'w') as f:
+        f.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{SVG_WIDTH}" height="{height}" font-family="sans-serif" font-size="10">\n')
+        f.write(f'<rect width="{SVG_WIDTH}" height="{height}" fill="white"/>\n')
+        for row, worker in enumerate(workers):
+            y = MARGIN + row * ROW_HEIGHT
+            f.write(f'<text x="{MARGIN - 5}" y="{y + ROW_HEIGHT * 0.7}" text-anchor="end">{worker["worker"]}</text>\n')
+            f.write(f'<rect x="{MARGIN}" y="{y + 2}" width="{SVG_WIDTH - MARGIN * 2}" height="{ROW_HEIGHT - 4}" fill="#eeeeee"/>\n')
+            for start, end in worker["busy_intervals"]:
+                f.write(
+                    f'<rect x="{x(start):.2f}" y="{y + 2}" width="{max(x(end) - x(start), 0.5):.2f}" '
+                    f'height="{ROW_HEIGHT - 4}" fill="#3b82f6"/>\n'
+                )
+            f.write(f'<text x="{SVG_WIDTH - MARGIN + 5}" y="{y + ROW_HEIGHT * 0.7}">{worker["utilization"]:.0f}%</text>\n')
+
+        # number of tasks running over time, under the workers
+        top = MARGIN + ROW_HEIGHT * len(workers) + 10
+        bottom = top + CONCURRENCY_HEIGHT - 10
+        scale = (bottom - top) / max(utilization["max_concurrency"], 1)
+        points = [f"{x(window_start):.2f},{bottom}"]
+        running = 0
+        for time, next_running in zip(utilization["concurrency"]["times"], utilization["concurrency"]["running"]):
+            points.append(f"{x(time):.2f},{bottom - running * scale:.2f}")
+            points.append(f"{x(time):.2f},{bottom - next_running * scale:.2f}")
+            running = next_running
+        f.write(f'<polyline points="{" ".join(points)}" fill="none" stroke="#ef4444"/>\n')
+        f.write(f'<text x="{MARGIN - 5}" y="{top + 10}" text-anchor="end">{utilization["max_concurrency"]}</text>\n')
+        f.write(f'<text x="{MARGIN - 5}" y="{bottom}" text-anchor="end">0</text>\n')
+        f.write(f'<text x="{MARGIN}" y="{height - MARGIN / 2}">{window_start:.3f}s</text>\n')
+        f.write(f'<text x="{SVG_WIDTH - MARGIN}" y="{height - MARGIN / 2}" text-anchor="end">{window_start + window:.3f}s</text>\n')
+        f.write('</svg>\n')
+
+    return filename
+
+
+def create_utilization_files(name, utilization):
+    with open(f"utilization-{name}.json", 'w') as f:
+        json.dump(utilization, f)
+
+    with open(f"utilization-{name}.md", 'w') as f:
+        f.write("# Worker Utilization\n\n")
+        f.write(f"- **Utilization**: {utilization['utilization']:.2f}% over {utilization['window']:.3f}s\n")
+        f.write(
+            f"- **Concurrency**: {utilization['avg_concurrency']:.2f} tasks on average, "
+            f"{utilization['max_concurrency']} at most\n"
+        )
+        f.write(
+            f"- **Imbalance**: the busiest worker is {utilization['busy_imbalance']:.2f}x the average busy time, "
+            f"the most loaded one runs {utilization['tasks_imbalance']:.2f}x the average number of tasks\n"
+        )
+        f.write("\n## Workers\n\n")
+        f.write("| **Worker** | **Tasks** | **Busy** | **Utilization** | **Idle gaps** | **Idle time** | **Idle p90** | **Longest idle** | **Max concurrency** |\n")
+        f.write("| ---------: | --------: | -------: | --------------: | ------------: | ------------: | -----------: | ---------------: | ------------------: |\n")
+        for worker in utilization["workers"]:
+            f.write(
+                f"| {worker['worker']} | {worker['tasks']} | {worker['busy']:.3f}s | {worker['utilization']:.2f}% "
+                f"| {worker['idle_gaps']} | {worker['idle_gaps_total']:.3f}s | {worker['idle_gaps_p90']:.3f}s "
+                f"| {worker['idle_gap_max']:.3f}s | {worker['max_concurrency']} |\n"
+            )
+        f.write(f"\nTotal tasks analyzed: {utilization['total_tasks']}\n")
+
+    return f"utilization-{name}.md", f"utilization-{name}.json"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Utilization, idle gaps, concurrency and load imbalance of the workers, from the timing JSON files"
+    )
+    parser.add_argument("files", nargs="+", help="Timing JSON files of the windmill, hatchet or temporal analyzers")
+    args = parser.parse_args()
+
+    for file_path in args.files:
+        for name, timings in load_benchmarks(file_path):
+            if not timings["started_at"]:
+                print(f"No tasks in {name}")
+                continue
+            utilization = compute_utilization(timings)
+            stats_file, json_file = create_utilization_files(name, utilization)
+            svg_file = create_gantt_svg(name, utilization)
+            print(f"Created {stats_file}, {json_file} and {svg_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,39 @@
 from datetime import datetime
 
+import hashlib
 import os
+import tempfile
+import fsspec
 import polars as pl
 import s3fs
 import datetime
 
 from airflow import DAG
 from airflow.decorators import dag, task
+from airflow.models.baseoperator import chain
 
-SCALE_FACTOR = "1g"
-BUCKET = "windmill"
+SCALE_FACTOR = os.environ.get("TPC_H_SCALE_FACTOR", "1g")
+# Queries of the DAG, e.g. 1-9 or 1,3,5. The Polars threads are set with POLARS_MAX_THREADS.
+QUERIES = os.environ.get("TPC_H_QUERIES", "1-9")
+# Root of the TPC-H datasets: a S3 bucket (s3://...) or a local directory. The S3 endpoint can be overridden with
+# S3_ENDPOINT_URL, for example to use MinIO
+STORAGE_ROOT = os.environ.get("TPC_H_STORAGE", "s3://windmill")
+# The tables downloaded from S3 are cached on the worker, and shared by all the tasks it runs. The least recently used
+# files are evicted when the cache grows over TPC_H_CACHE_SIZE_GB, 0 disables the cache
+CACHE_DIR = os.environ.get("TPC_H_CACHE_DIR", os.path.join(tempfile.gettempdir(), "tpc_h_cache"))
+CACHE_SIZE = float(os.environ.get("TPC_H_CACHE_SIZE_GB", "20")) * 1024**3
+# How the queries are scheduled: "sequential" (one after the other), "fanout" (all at once, bounded by the Airflow
+# parallelism) or "pool" (all at once, bounded by the slots of the TPC_H_POOL pool)
+TOPOLOGY = os.environ.get("TPC_H_TOPOLOGY", "sequential")
+POOL = os.environ.get("TPC_H_POOL", "tpc_h")
 
 
 @task(task_id=f"query_9")
 def query_9():
-    s3 = s3_file_system()
-    with load_dataset(s3, "lineitem") as lineitem_ipt, load_dataset(
-        s3, "orders"
-    ) as orders_ipt, load_dataset(s3, "customer") as customer_ipt:
+    fs = file_system()
+    with load_dataset(fs, "lineitem") as lineitem_ipt, load_dataset(
+        fs, "orders"
+    ) as orders_ipt, load_dataset(fs, "customer") as customer_ipt:
         lineitem = pl.read_parquet(lineitem_ipt).lazy()
         orders = pl.read_parquet(orders_ipt).lazy()
         customer = pl.read_parquet(customer_ipt).lazy()
@@ -41,15 +57,15 @@ def query_9():
             .collect()
         )
         print(output)
-        write_dataset(s3, output, 9)
+        write_dataset(fs, output, 9)
 
 
 @task(task_id=f"query_8")
 def query_8():
-    s3 = s3_file_system()
-    with load_dataset(s3, "supplier") as supplier_ipt, load_dataset(
-        s3, "part"
-    ) as part_ipt, load_dataset(s3, "partsupp") as partsupp_ipt:
+    fs = file_system()
+    with load_dataset(fs, "supplier") as supplier_ipt, load_dataset(
+        fs, "part"
+    ) as part_ipt, load_dataset(fs, "partsupp") as partsupp_ipt:
         supplier = pl.read_parquet(supplier_ipt).lazy()
         part = pl.read_parquet(part_ipt).lazy()
         partsupp = pl.read_parquet(partsupp_ipt).lazy()
@@ -73,14 +89,14 @@ def query_8():
             .collect()
         )
         print(output)
-        write_dataset(s3, output, 8)
+        write_dataset(fs, output, 8)
 
 
 @task(task_id=f"query_7")
 def query_7():
-    s3 = s3_file_system()
-    with load_dataset(s3, "lineitem") as lineitem_ipt, load_dataset(
-        s3, "part"
+    fs = file_system()
+    with load_dataset(fs, "lineitem") as lineitem_ipt, load_dataset(
+        fs, "part"
     ) as part_ipt:
         lineitem = pl.read_parquet(lineitem_ipt).lazy()
         part = pl.read_parquet(part_ipt).lazy()
@@ -109,14 +125,14 @@ def query_7():
             .collect()
         )
         print(output)
-        write_dataset(s3, output, 7)
+        write_dataset(fs, output, 7)
 
 
 @task(task_id=f"query_6")
 def query_6():
-    s3 = s3_file_system()
-    with load_dataset(s3, "lineitem") as lineitem_ipt, load_dataset(
-        s3, "orders"
+    fs = file_system()
+    with load_dataset(fs, "lineitem") as lineitem_ipt, load_dataset(
+        fs, "orders"
     ) as orders_ipt:
         lineitem = pl.read_parquet(lineitem_ipt).lazy()
         orders = pl.read_parquet(orders_ipt).lazy()
@@ -156,16 +172,16 @@ def query_6():
             .collect()
         )
         print(output)
-        write_dataset(s3, output, 6)
+        write_dataset(fs, output, 6)
 
 
 @task(task_id=f"query_5")
 def query_5():
-    s3 = s3_file_system()
-    with load_dataset(s3, "lineitem") as lineitem_ipt, load_dataset(
-        s3, "orders"
-    ) as orders_ipt, load_dataset(s3, "customer") as customer_ipt, load_dataset(
-        s3, "nation"
+    fs = file_system()
+    with load_dataset(fs, "lineitem") as lineitem_ipt, load_dataset(
+        fs, "orders"
+    ) as orders_ipt, load_dataset(fs, "customer") as customer_ipt, load_dataset(
+        fs, "nation"
     ) as nation_ipt:
         lineitem = pl.read_parquet(lineitem_ipt).lazy()
         orders = pl.read_parquet(orders_ipt).lazy()
@@ -204,13 +220,13 @@ def query_5():
             .collect()
         )
         print(output)
-        write_dataset(s3, output, 5)
+        write_dataset(fs, output, 5)
 
 
 @task(task_id=f"query_4")
 def query_4():
-    s3 = s3_file_system()
-    with load_dataset(s3, "lineitem") as lineitem_ipt:
+    fs = file_system()
+    with load_dataset(fs, "lineitem") as lineitem_ipt:
         lineitem = pl.read_parquet(lineitem_ipt).lazy()
         output = (
             lineitem.filter(pl.col("L_SHIPDATE") >= datetime.datetime(1994, 1, 1))
@@ -227,20 +243,20 @@ def query_4():
             .collect()
         )
         print(output)
-        write_dataset(s3, output, 4)
+        write_dataset(fs, output, 4)
 
 
 @task(task_id=f"query_3")
 def query_3():
-    s3 = s3_file_system()
-    with load_dataset(s3, "lineitem") as lineitem_ipt, load_dataset(
-        s3, "orders"
-    ) as orders_ipt, load_dataset(s3, "customer") as customer_ipt, load_dataset(
-        s3, "supplier"
+    fs = file_system()
+    with load_dataset(fs, "lineitem") as lineitem_ipt, load_dataset(
+        fs, "orders"
+    ) as orders_ipt, load_dataset(fs, "customer") as customer_ipt, load_dataset(
+        fs, "supplier"
     ) as supplier_ipt, load_dataset(
-        s3, "nation"
+        fs, "nation"
     ) as nation_ipt, load_dataset(
-        s3, "region"
+        fs, "region"
     ) as region_ipt:
         lineitem = pl.read_parquet(lineitem_ipt).lazy()
         orders = pl.read_parquet(orders_ipt).lazy()
@@ -272,7 +288,7 @@ def query_3():
             .collect()
         )
         print(output)
-        write_dataset(s3, output, 3)
+        write_dataset(fs, output, 3)
 
 
 @task(
@@ -280,10 +296,10 @@ def query_3():
     execution_timeout=datetime.timedelta(hours=2),
 )
 def query_2():
-    s3 = s3_file_system()
-    with load_dataset(s3, "lineitem") as lineitem_ipt, load_dataset(
-        s3, "orders"
-    ) as orders_ipt, load_dataset(s3, "customer") as customer_ipt:
+    fs = file_system()
+    with load_dataset(fs, "lineitem") as lineitem_ipt, load_dataset(
+        fs, "orders"
+    ) as orders_ipt, load_dataset(fs, "customer") as customer_ipt:
         lineitem = pl.read_parquet(lineitem_ipt).lazy()
         orders = pl.read_parquet(orders_ipt).lazy()
         customer = pl.read_parquet(customer_ipt).lazy()
@@ -306,13 +322,13 @@ def query_2():
             .collect()
         )
         print(output)
-        write_dataset(s3, output, 2)
+        write_dataset(fs, output, 2)
 
 
 @task(task_id=f"query_1")
 def query_1():
-    s3 = s3_file_system()
-    with load_dataset(s3, "lineitem") as lineitem_ipt:
+    fs = file_system()
+    with load_dataset(fs, "lineitem") as lineitem_ipt:
         lineitem = pl.read_parquet(lineitem_ipt).lazy()
         output = (
             lineitem.filter(
@@ -344,29 +360,104 @@ def query_1():
             .collect()
         )
         print(output)
-        write_dataset(s3, output, 1)
+        write_dataset(fs, output, 1)
 
 
-def load_dataset(s3, dataset_name):
-    dataset_uri = "s3://{}/tpc-h/{}/raw/{}.parquet".format(
-        BUCKET, SCALE_FACTOR, dataset_name
+def load_dataset(fs, dataset_name):
+    dataset_uri = "{}/tpc-h/{}/raw/{}.parquet".format(
+        STORAGE_ROOT, SCALE_FACTOR, dataset_name
     )
-    return s3.open(dataset_uri, mode="rb")
+    if not STORAGE_ROOT.startswith("s3://") or CACHE_SIZE <= 0:
+        return fs.open(dataset_uri, mode="rb")
+    return cached_dataset(fs, dataset_uri)
 
 
-def write_dataset(s3, dataset, query_number):
-    output_uri = "s3://{}/tpc-h/{}/output_airflow/query_{}.parquet".format(
-        BUCKET, SCALE_FACTOR, query_number
+def cached_dataset(fs, dataset_uri):
+    # The cache is content addressed: a new version of the file on S3 has another ETag, and thus another cache entry.
+    # The file is returned opened: a file evicted by another task remains readable until it is closed.
+    etag = fs.info(dataset_uri)["ETag"]
+    cache_key = hashlib.sha256("{}:{}".format(dataset_uri, etag).encode()).hexdigest()
+    cache_path = os.path.join(CACHE_DIR, "{}.parquet".format(cache_key))
+
+    try:
+        cached_file = open(cache_path, mode="rb")
+    except FileNotFoundError:
+        # not cached yet, or evicted by another task
+        pass
+    else:
+        print("Reading {} from the worker cache: {}".format(dataset_uri, cache_path))
+        try:
+            # the modification time is the last access time used for the LRU eviction
+            os.utime(cache_path)
+        except FileNotFoundError:
+            pass
+        return cached_file
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    print("Downloading {} to the worker cache: {}".format(dataset_uri, cache_path))
+    # Downloaded next to its final path and renamed once complete, such that the tasks running concurrently never read
+    # a partial file. If two tasks download the same file, the last rename wins and both files are identical.
+    tmp_fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    os.close(tmp_fd)
+    try:
+        fs.get_file(dataset_uri, tmp_path)
+        # opened before the rename, such that it can't be evicted before it is read
+        cached_file = open(tmp_path, mode="rb")
+        os.replace(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    evict_cache(keep=cache_path)
+    return cached_file
+
+
+def evict_cache(keep):
+    # The files opened by other tasks remain readable after their removal, until they are closed
+    cached_files = []
+    for file_name in os.listdir(CACHE_DIR):
+        if not file_name.endswith(".parquet"):
+            continue
+        try:
+            stat = os.stat(os.path.join(CACHE_DIR, file_name))
+        except FileNotFoundError:
+            continue
+        cached_files.append((stat.st_mtime, stat.st_size, os.path.join(CACHE_DIR, file_name)))
+
+    cache_size = sum(size for _, size, _ in cached_files)
+    for mtime, size, path in sorted(cached_files):
+        if cache_size <= CACHE_SIZE:
+            break
+        if path == keep:
+            continue
+        try:
+            # a file read or downloaded again by another task since the listing is not the least recently used anymore
+            if os.stat(path).st_mtime != mtime:
+                continue
+            print("Evicting {} from the worker cache".format(path))
+            os.remove(path)
+        except FileNotFoundError:
+            # already evicted by another task
+            pass
+        cache_size -= size
+
+
+def write_dataset(fs, dataset, query_number):
+    output_uri = "{}/tpc-h/{}/output-airflow/query_{}.parquet".format(
+        STORAGE_ROOT, SCALE_FACTOR, query_number
     )
-    with s3.open(output_uri, mode="wb") as output:
-        print("Writing results to S3 output: {}".format(output_uri))
-        dataset.write_parquet(output)
+    print("Writing results to: {}".format(output_uri))
+    if not STORAGE_ROOT.startswith("s3://"):
+        fs.makedirs(os.path.dirname(output_uri), exist_ok=True)
+    # Written by the native writer of Polars, which uploads the row groups to S3 in parts as they are encoded
+    dataset.write_parquet(output_uri, storage_options=storage_options())
 
 
-def s3_file_system():
+def file_system():
+    if not STORAGE_ROOT.startswith("s3://"):
+        return fsspec.filesystem("file", auto_mkdir=True)
     args = {
         "anon": False,
-        # "endpoint_url": "http://minio:9000",
+        "endpoint_url": os.environ.get("S3_ENDPOINT_URL"),  # e.g. http://minio:9000, None for AWS
         "key": os.environ.get("AWS_ACCESS_KEY"),
         "secret": os.environ.get("AWS_SECRET_KEY"),
         "use_ssl": False,
@@ -378,21 +469,55 @@ def s3_file_system():
     return s3fs.S3FileSystem(**args)
 
 
+def storage_options():
+    # Same credentials as file_system(), in the format expected by the Polars writer
+    if not STORAGE_ROOT.startswith("s3://"):
+        return None
+    options = {
+        "aws_endpoint_url": os.environ.get("S3_ENDPOINT_URL"),
+        "aws_allow_http": "true",
+        "aws_access_key_id": os.environ.get("AWS_ACCESS_KEY"),
+        "aws_secret_access_key": os.environ.get("AWS_SECRET_KEY"),
+        "aws_region": os.environ.get("AWS_REGION"),
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def parse_query_numbers(queries):
+    # e.g. "1-9", "4" or "1,3,5-7"
+    query_numbers = []
+    for query_range in queries.split(","):
+        first, _, last = query_range.partition("-")
+        query_numbers.extend(range(int(first), int(last or first) + 1))
+    return query_numbers
+
+
 with DAG(
     dag_id="tpc_h_{}".format(SCALE_FACTOR),
     schedule=None,
     start_date=datetime.datetime(2023, 1, 1),
     catchup=False,
-    tags=["benchmark"],
+    tags=["benchmark", TOPOLOGY],
 ) as dag:
-    (
-        query_1()
-        >> query_2()
-        >> query_3()
-        >> query_4()
-        >> query_5()
-        >> query_6()
-        >> query_7()
-        >> query_8()
-        >> query_9()
-    )
+    queries = [
+        query_1,
+        query_2,
+        query_3,
+        query_4,
+        query_5,
+        query_6,
+        query_7,
+        query_8,
+        query_9,
+    ]
+    queries = [queries[query_number - 1] for query_number in parse_query_numbers(QUERIES)]
+    # The queries are independent, only the dependencies between the tasks change
+    match TOPOLOGY:
+        case "sequential":
+            chain(*[query() for query in queries])
+        case "fanout":
+            [query() for query in queries]
+        case "pool":
+            [query.override(pool=POOL)() for query in queries]
+        case _:
+            raise ValueError("Unknown topology {}".format(TOPOLOGY))
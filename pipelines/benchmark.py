@@ -0,0 +1,368 @@
+import argparse
+import csv
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from query_numbers import parse_query_numbers
+
+PIPELINES_DIR = os.path.dirname(os.path.abspath(__file__))
+ENGINES = ["polars", "duckdb", "spark", "airflow"]
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def main(
+    engines,
+    scale_factors,
+    query_numbers,
+    output,
+    sample_interval,
+    spark_submit,
+    threads=None,
+    memory_limit=None,
+    repetitions=3,
+    warmup=1,
+    noise_threshold=0.1,
+    polars_streaming=False,
+):
+    results = []
+    for scale_factor in scale_factors:
+        for engine in engines:
+            for query_number in query_numbers:
+                command = engine_command(
+                    engine,
+                    scale_factor,
+                    query_number,
+                    spark_submit,
+                    threads,
+                    memory_limit,
+                    polars_streaming,
+                )
+                cwd = os.path.join(PIPELINES_DIR, engine)
+                env = engine_env(engine, scale_factor, query_number, threads)
+
+                # The cold run is the first run of the query in a fresh process: it pays for the S3 fetches, the
+                # JVM start or the DuckDB extension load. The process is measured as a whole.
+                print(
+                    "Running {} query_{} on {}: {}".format(
+                        engine, query_number, scale_factor, " ".join(command)
+                    )
+                )
+                result, query_timings = run(command, cwd, env, sample_interval, engine)
+                cold_query = query_timings[0] if query_timings else result["wall_s"]
+                result = {
+                    "engine": engine,
+                    "scale_factor": scale_factor,
+                    "query": query_number,
+                    **result,
+                    "cold_query_s": round(cold_query, 3),
+                }
+                print(
+                    "  cold: {:.3f}s wall, {:.3f}s cpu, {:.1f}MB peak RSS, exit code {}".format(
+                        result["wall_s"],
+                        result["cpu_s"],
+                        result["peak_rss_mb"],
+                        result["exit_code"],
+                    )
+                )
+
+                # The warm runs are repeated in the same process after the warmup ones. Airflow tasks can't be
+                # repeated in a process, each of its runs is a new process.
+                warm_timings = []
+                if repetitions > 0 and engine == "airflow":
+                    for repetition in range(warmup + repetitions):
+                        warm_result, _ = run(command, cwd, env, sample_interval, engine)
+                        if repetition >= warmup:
+                            warm_timings.append(warm_result["wall_s"])
+                elif repetitions > 0:
+                    warm_command = command + [
+                        "--repetitions",
+                        str(repetitions),
+                        "--warmup",
+                        str(warmup),
+                    ]
+                    _, warm_timings = run(warm_command, cwd, env, sample_interval, engine)
+                if warm_timings:
+                    summary = summarize(warm_timings, noise_threshold)
+                    result.update(
+                        {"warm_{}".format(name): value for name, value in summary.items()}
+                    )
+                    # only in the JSON report, for the comparisons between runs (see results_store.py)
+                    result["warm_samples_s"] = [round(sample, 3) for sample in warm_timings]
+                    print(
+                        "  warm: {:.3f}s median, {:.3f}s p95, {:.3f}s stddev over {} runs{}".format(
+                            summary["median_s"],
+                            summary["p95_s"],
+                            summary["stddev_s"],
+                            summary["runs"],
+                            ", noisy" if summary["noisy"] else "",
+                        )
+                    )
+                results.append(result)
+
+    with open("{}.json".format(output), "w") as f:
+        json.dump(results, f, indent=4)
+    with open("{}.csv".format(output), "w", newline="") as f:
+        # the warm columns are missing when the warm runs failed
+        fieldnames = [
+            name
+            for name in max((list(result.keys()) for result in results), key=len)
+            if name != "warm_samples_s"
+        ]
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+    print("Report written to {0}.json and {0}.csv".format(output))
+    return results
+
+
+def run(command, cwd, env, sample_interval, engine):
+    # Returns the measures of the process, and the wall time of each measured run of the query reported by the engine
+    if engine == "airflow":
+        return measure(command, cwd, env, sample_interval), []
+
+    with tempfile.TemporaryDirectory() as timings_dir:
+        timings_path = os.path.join(timings_dir, "timings.json")
+        result = measure(
+            command + ["--timings-output", timings_path], cwd, env, sample_interval
+        )
+        if result["exit_code"] != 0 or not os.path.exists(timings_path):
+            return result, []
+        with open(timings_path) as f:
+            timings = json.load(f)
+    # a single query runs in the process
+    query_timings = next(
+        (timings for name, timings in timings.items() if name.startswith("query_")), []
+    )
+    return result, [repetition_timings["wall"] for repetition_timings in query_timings]
+
+
+def summarize(samples, noise_threshold):
+    mean = statistics.mean(samples)
+    stddev = statistics.stdev(samples) if len(samples) > 1 else 0.0
+    # 95% confidence interval of the mean, with the Student t distribution
+    margin = t_value(len(samples) - 1) * stddev / math.sqrt(len(samples))
+    return {
+        "runs": len(samples),
+        "median_s": round(statistics.median(samples), 3),
+        "p95_s": round(percentile(samples, 95), 3),
+        "stddev_s": round(stddev, 3),
+        "ci95_low_s": round(mean - margin, 3),
+        "ci95_high_s": round(mean + margin, 3),
+        # the runs are noisy when their coefficient of variation is over the threshold, e.g. on a shared host
+        "noisy": stddev / mean > noise_threshold if mean > 0 else False,
+    }
+
+
+def percentile(samples, percent):
+    # linear interpolation between the closest ranks
+    samples = sorted(samples)
+    rank = (len(samples) - 1) * percent / 100
+    lower = math.floor(rank)
+    upper = min(lower + 1, len(samples) - 1)
+    return samples[lower] + (samples[upper] - samples[lower]) * (rank - lower)
+
+
+def t_value(degrees_of_freedom):
+    # two-sided 97.5% quantiles of the Student t distribution, the normal one is used above 30 degrees of freedom
+    t_values = [
+        12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+    ]
+    if degrees_of_freedom < 1:
+        return 0.0
+    if degrees_of_freedom > len(t_values):
+        return 1.96
+    return t_values[degrees_of_freedom - 1]
+
+
+def engine_command(
+    engine,
+    scale_factor,
+    query_number,
+    spark_submit,
+    threads,
+    memory_limit,
+    polars_streaming=False,
+):
+    # Each query runs in its own process, such that its peak memory is not polluted by the previous ones
+    match engine:
+        case "polars" | "duckdb":
+            command = [
+                sys.executable,
+                os.path.join(PIPELINES_DIR, engine, "tpc_h.py"),
+                "--scale",
+                scale_factor,
+                "--queries",
+                str(query_number),
+            ]
+        case "spark":
+            # the driver JVM is started by spark-submit, its memory can only be set by its own option
+            command = [spark_submit]
+            if memory_limit is not None:
+                command += ["--driver-memory", memory_limit]
+            command += [
+                os.path.join(PIPELINES_DIR, "spark", "tpc_h.py"),
+                "--remote",
+                "true",
+                "--scale",
+                scale_factor,
+                "--queries",
+                str(query_number),
+            ]
+        case "airflow":
+            # the DAG is configured by the environment, see engine_env()
+            return [
+                "airflow",
+                "tasks",
+                "test",
+                "tpc_h_{}".format(scale_factor),
+                "query_{}".format(query_number),
+            ]
+        case _:
+            raise ValueError("Unknown engine {}".format(engine))
+
+    if threads is not None:
+        command += ["--threads", str(threads)]
+    # Polars has no memory limit
+    if memory_limit is not None and engine == "duckdb":
+        command += ["--memory-limit", memory_limit]
+    if polars_streaming and engine == "polars":
+        command.append("--streaming")
+    return command
+
+
+def engine_env(engine, scale_factor, query_number, threads):
+    env = dict(os.environ, TPC_H_SCALE_FACTOR=scale_factor, TPC_H_QUERIES=str(query_number))
+    if engine == "airflow" and threads is not None:
+        env["POLARS_MAX_THREADS"] = str(threads)
+    return env
+
+
+def measure(command, cwd, env, sample_interval):
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=cwd, env=env)
+
+    peak_rss = 0
+    done = threading.Event()
+
+    def sample_rss():
+        nonlocal peak_rss
+        while not done.is_set():
+            peak_rss = max(peak_rss, process_tree_rss(process.pid))
+            done.wait(sample_interval)
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    # wait4 returns the resources used by the process and all the descendants it waited for
+    _, status, rusage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    done.set()
+    sampler.join()
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    return {
+        "wall_s": round(wall, 3),
+        "cpu_s": round(rusage.ru_utime + rusage.ru_stime, 3),
+        "peak_rss_mb": round(peak_rss / 1024**2, 1),
+        # peak RSS of the largest single process of the tree, as reported by the kernel
+        "max_rss_mb": round(rusage.ru_maxrss / 1024, 1),
+        "exit_code": process.returncode,
+    }
+
+
+def process_tree_rss(root_pid):
+    # Spark and Airflow spawn child processes (JVM, task runners), the RSS of the whole tree is summed
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/{}/stat".format(entry)) as f:
+                # the command name can contain spaces, the fields are parsed after its closing parenthesis
+                parent_pid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent_pid, []).append(int(entry))
+
+    rss = 0
+    pids = [root_pid]
+    while pids:
+        pid = pids.pop()
+        try:
+            with open("/proc/{}/statm".format(pid)) as f:
+                rss += int(f.read().split()[1]) * PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            continue
+        pids.extend(children.get(pid, []))
+    return rss
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the TPC-H queries on several engines and measure them"
+    )
+    parser.add_argument(
+        "--engines", nargs="+", choices=ENGINES, default=["polars", "duckdb"], help="engines"
+    )
+    parser.add_argument("--scales", nargs="+", default=["1g"], help="scale factors")
+    parser.add_argument("--queries", default="1-9", help="queries, e.g. 1-9 or 1,3,5")
+    parser.add_argument(
+        "--output", default="tpc_h_report", help="report file name, without extension"
+    )
+    parser.add_argument(
+        "--sample-interval",
+        type=float,
+        default=0.05,
+        help="interval between two RSS samples, in seconds",
+    )
+    parser.add_argument(
+        "--spark-submit", default="spark-submit", help="spark-submit executable"
+    )
+    parser.add_argument("--threads", type=int, help="threads used by the engines")
+    parser.add_argument(
+        "--memory-limit",
+        help="memory limit of DuckDB and --driver-memory of spark-submit, e.g. 8GB (Polars has none)",
+    )
+    parser.add_argument(
+        "--repetitions",
+        type=int,
+        default=3,
+        help="warm runs of each query, 0 to only measure the cold run",
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=1, help="unmeasured runs before the warm runs"
+    )
+    parser.add_argument(
+        "--noise-threshold",
+        type=float,
+        default=0.1,
+        help="coefficient of variation over which the warm runs are flagged as noisy",
+    )
+    parser.add_argument(
+        "--polars-streaming",
+        action="store_true",
+        help="run the Polars queries with the streaming engine",
+    )
+    args = parser.parse_args()
+
+    main(
+        args.engines,
+        args.scales,
+        parse_query_numbers(args.queries),
+        args.output,
+        args.sample_interval,
+        args.spark_submit,
+        threads=args.threads,
+        memory_limit=args.memory_limit,
+        repetitions=args.repetitions,
+        warmup=args.warmup,
+        noise_threshold=args.noise_threshold,
+        polars_streaming=args.polars_streaming,
+    )
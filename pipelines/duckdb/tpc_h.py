@@ -1,17 +1,270 @@
+import argparse
 import duckdb
+import json
 import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+# Root of the TPC-H datasets: a S3 bucket (s3://...) or a local directory. The S3 endpoint can be overridden with
+# S3_ENDPOINT_URL, for example to use MinIO
+STORAGE_ROOT = os.environ.get("TPC_H_STORAGE", "s3://windmill")
+TABLES = [
+    "customer",
+    "orders",
+    "lineitem",
+    "supplier",
+    "part",
+    "partsupp",
+    "nation",
+    "region",
+]
+
+
+def main(
+    scale_factor="1g",
+    query_numbers=None,
+    load_mode="memory",
+    parallelism=1,
+    memory_limit=None,
+    threads=None,
+    repetitions=1,
+    warmup=0,
+    temp_directory=None,
+    sample_interval=0.05,
+    profile=False,
+):
+    query_numbers = query_numbers or range(1, 10)
+
+    if load_mode == "persistent":
+        # One database file per scale factor. It is kept between runs and the tables are only reloaded when
+        # their source parquet file changed on S3
+        conn = duckdb.connect("./home/tpc_h_{}.duckdb".format(scale_factor))
+    else:
+        conn = duckdb.connect()  # in memory DB
+
+    connect_storage(conn)
+    if memory_limit is not None:
+        # The limit is shared by all the queries running concurrently on the database
+        conn.execute("SET memory_limit='{}';".format(memory_limit))
+    if threads is not None:
+        conn.execute("SET threads={};".format(threads))
+    if temp_directory is not None:
+        # The operators that do not fit in the memory limit spill their intermediate results to this directory
+        conn.execute("SET temp_directory='{}';".format(temp_directory))
+
+    timings = {}
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    if load_mode == "parquet":
+        # Nothing is ingested, each query reads the columns and row groups it needs from the parquet files
+        for table_name in TABLES:
+            create_view_from_parquet(conn, scale_factor, table_name)
+    else:
+        init_sql_schema(conn)
+        for table_name in TABLES:
+            if load_mode == "persistent":
+                load_table_if_changed(conn, scale_factor, table_name)
+            else:
+                load_table_from_parquet(conn, scale_factor, table_name)
+    timings["load"] = [
+        {
+            "wall": time.perf_counter() - wall_start,
+            "cpu": time.process_time() - cpu_start,
+        }
+    ]
+    print(
+        "load ({}): {:.3f}s wall, {:.3f}s cpu".format(
+            load_mode, timings["load"][0]["wall"], timings["load"][0]["cpu"]
+        )
+    )
+
+    queries = [
+        query_1,
+        query_2,
+        query_3,
+        query_4,
+        query_5,
+        query_6,
+        query_7,
+        query_8,
+        query_9,
+    ]
+    # The COPY statements spend a large part of their time uploading the results to S3, running several of them
+    # concurrently keeps the cores busy in the meantime
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        futures = [
+            executor.submit(
+                run_query,
+                conn,
+                scale_factor,
+                query_number,
+                queries[query_number - 1],
+                repetitions,
+                warmup,
+                sample_interval,
+                profile,
+            )
+            for query_number in query_numbers
+        ]
+        if parallelism > 1:
+            # the memory limit, the threads and the temporary directory are the ones of the shared connection
+            print(
+                "up to {} queries run concurrently: the cpu time, peak memory and spill of each query are "
+                "those of the whole database".format(parallelism)
+            )
+        for query_number, future in zip(query_numbers, futures):
+            query_timings = future.result()
+            timings["query_{}".format(query_number)] = query_timings
+            for repetition_timings in query_timings:
+                print(
+                    "query_{}: {:.3f}s wall, {:.3f}s cpu, {:.1f}MB peak memory, {:.1f}MB spilled".format(
+                        query_number,
+                        repetition_timings["wall"],
+                        repetition_timings["cpu"],
+                        repetition_timings["peak_memory_mb"],
+                        repetition_timings["peak_spill_mb"],
+                    )
+                )
+
+    conn.close()
+    return timings
+
+
+def run_query(
+    conn,
+    scale_factor,
+    query_number,
+    query,
+    repetitions=1,
+    warmup=0,
+    sample_interval=0.05,
+    profile=False,
+):
+    output_uri = "{}/tpc-h/{}/output-duckdb/query_{}.parquet".format(
+        STORAGE_ROOT, scale_factor, query_number
+    )
+    if not STORAGE_ROOT.startswith("s3://"):
+        os.makedirs(os.path.dirname(output_uri), exist_ok=True)
+    # A DuckDB connection can't be used from several threads, each query gets its own cursor
+    cursor = conn.cursor()
+    connect_storage(cursor)
+    if profile:
+        # The profiling settings are per cursor, the profile of each run overwrites the previous one. The directory is
+        # removed once the profile is saved, or when it is garbage collected if the query fails.
+        profile_dir = tempfile.TemporaryDirectory()
+        profile_path = os.path.join(
+            profile_dir.name, "query_{}.profile.json".format(query_number)
+        )
+        cursor.execute("PRAGMA enable_profiling='json';")
+        cursor.execute("PRAGMA profiling_output='{}';".format(profile_path))
+    # The warmup runs are not measured. CPU time is measured for the whole process, it overlaps between queries
+    # running in parallel
+    query_timings = []
+    for repetition in range(warmup + repetitions):
+        done = threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as sampler_executor:
+            sampler = sampler_executor.submit(sample_memory, conn, done, sample_interval)
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            try:
+                query(cursor, output_uri)
+            finally:
+                done.set()
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            peak_memory, peak_spill = sampler.result()
+        if repetition >= warmup:
+            query_timings.append(
+                {
+                    "wall": wall,
+                    "cpu": cpu,
+                    "peak_memory_mb": peak_memory / 1024**2,
+                    "peak_spill_mb": peak_spill / 1024**2,
+                }
+            )
+    cursor.close()
+
+    if profile:
+        with profile_dir:
+            with open(profile_path) as f:
+                operators = profile_operators(json.load(f), query_number)
+        save_profile(conn, scale_factor, operators, query_number)
+    return query_timings
+
+
+def profile_operators(node, query_number, parent_id=None, operators=None):
+    # Flattens the tree of operators of the JSON profile. The keys were renamed in DuckDB 1.1 (name -> operator_name,
+    # ...), both versions are read. The timing of an operator excludes the time spent in its children.
+    operators = [] if operators is None else operators
+    name = node.get("operator_name", node.get("name"))
+    if name:
+        detail = node.get("extra_info")
+        operators.append(
+            {
+                "engine": "duckdb",
+                "query": query_number,
+                "operator_id": len(operators),
+                "parent_id": parent_id,
+                "operator": name.strip(),
+                "time_s": node.get("operator_timing", node.get("timing")),
+                "rows": node.get("operator_cardinality", node.get("cardinality")),
+                "detail": json.dumps(detail) if isinstance(detail, dict) else detail,
+            }
+        )
+        parent_id = len(operators) - 1
+    for child in node.get("children", []):
+        profile_operators(child, query_number, parent_id, operators)
+    return operators
+
+
+def save_profile(conn, scale_factor, operators, query_number):
+    profile_uri = "{}/tpc-h/{}/output-duckdb/query_{}.profile.json".format(
+        STORAGE_ROOT, scale_factor, query_number
+    )
+    # Written next to the result by DuckDB itself, which is already connected to the storage
+    with tempfile.TemporaryDirectory() as operators_dir:
+        operators_path = os.path.join(operators_dir, "operators.json")
+        with open(operators_path, "w") as f:
+            json.dump(operators, f)
+        cursor = conn.cursor()
+        connect_storage(cursor)
+        cursor.execute(
+            """
+            COPY (SELECT * FROM read_json_auto('{}')) TO '{}' (FORMAT JSON, ARRAY true);
+        """.format(
+                operators_path, profile_uri
+            )
+        )
+        cursor.close()
+
 
-BUCKET = "windmill"
+def sample_memory(conn, done, sample_interval):
+    # duckdb_memory() reports the memory held by the buffer manager and the size of the data spilled to the temporary
+    # directory. They are global to the database: they include the other queries when several run in parallel.
+    cursor = conn.cursor()
+    peak_memory, peak_spill = 0, 0
+    while True:
+        memory, spill = cursor.execute(
+            "SELECT sum(memory_usage_bytes), sum(temporary_storage_bytes) FROM duckdb_memory()"
+        ).fetchone()
+        peak_memory, peak_spill = max(peak_memory, memory or 0), max(peak_spill, spill or 0)
+        if done.wait(sample_interval):
+            break
+    cursor.close()
+    return peak_memory, peak_spill
 
 
-def main():
-    conn = duckdb.connect()  # in memory DB
-    # conn = duckdb.connect("./home/duck.db") # this can be used to persist DB data to a file on disk
+def connect_storage(conn):
+    conn.execute("SET home_directory='./home/';")
+    if STORAGE_ROOT.startswith("s3://"):
+        connect_s3(conn)
 
+
+def connect_s3(conn):
     # This needs to be run to connect DuckDB to the S3 bucket
     conn.execute(
         """
-        SET home_directory='./home/';
         INSTALL 'httpfs';
         LOAD 'httpfs';
         SET s3_region='{}';
@@ -23,68 +276,59 @@ def main():
             os.environ.get("AWS_SECRET_KEY"),
         )
     )
+    if os.environ.get("S3_ENDPOINT_URL"):
+        endpoint_url = urlparse(os.environ.get("S3_ENDPOINT_URL"))
+        conn.execute(
+            """
+            SET s3_endpoint='{}';
+            SET s3_use_ssl={};
+            SET s3_url_style='path';
+        """.format(
+                endpoint_url.netloc, str(endpoint_url.scheme == "https").lower()
+            )
+        )
 
-    scale_factor = "1g"
-    load_table_from_parquet(conn, BUCKET, scale_factor, "customer")
-    load_table_from_parquet(conn, BUCKET, scale_factor, "orders")
-    load_table_from_parquet(conn, BUCKET, scale_factor, "lineitem")
-    load_table_from_parquet(conn, BUCKET, scale_factor, "supplier")
-    load_table_from_parquet(conn, BUCKET, scale_factor, "part")
-    load_table_from_parquet(conn, BUCKET, scale_factor, "partsupp")
-    load_table_from_parquet(conn, BUCKET, scale_factor, "nation")
-    load_table_from_parquet(conn, BUCKET, scale_factor, "region")
-
-    output_filename = "{}/{}/output-duckdb/{}.parquet".format(
-        BUCKET, scale_factor, "query_1"
-    )
-    query_1(conn, output_filename)
-
-    output_filename = "{}/{}/output-duckdb/{}.parquet".format(
-        BUCKET, scale_factor, "query_2"
-    )
-    query_2(conn, output_filename)
-
-    output_filename = "{}/{}/output-duckdb/{}.parquet".format(
-        BUCKET, scale_factor, "query_3"
-    )
-    query_3(conn, output_filename)
-
-    output_filename = "{}/{}/output-duckdb/{}.parquet".format(
-        BUCKET, scale_factor, "query_4"
-    )
-    query_4(conn, output_filename)
-
-    output_filename = "{}/{}/output-duckdb/{}.parquet".format(
-        BUCKET, scale_factor, "query_5"
-    )
-    query_5(conn, output_filename)
-
-    output_filename = "{}/{}/output-duckdb/{}.parquet".format(
-        BUCKET, scale_factor, "query_6"
-    )
-    query_6(conn, output_filename)
-
-    output_filename = "{}/{}/output-duckdb/{}.parquet".format(
-        BUCKET, scale_factor, "query_7"
-    )
-    query_7(conn, output_filename)
-
-    output_filename = "{}/{}/output-duckdb/{}.parquet".format(
-        BUCKET, scale_factor, "query_8"
-    )
-    query_8(conn, output_filename)
 
-    output_filename = "{}/{}/output-duckdb/{}.parquet".format(
-        BUCKET, scale_factor, "query_9"
+def compare_load_modes(
+    scale_factor="1g", query_numbers=None, load_modes=("memory", "parquet"), **options
+):
+    # The other options of main (threads, memory limit, repetitions...) are the same for all the load modes
+    timings = {
+        load_mode: main(
+            scale_factor=scale_factor,
+            query_numbers=query_numbers,
+            load_mode=load_mode,
+            **options,
+        )
+        for load_mode in load_modes
+    }
+
+    # The median of the measured repetitions of each step, the total is the sum of those medians
+    medians = {
+        load_mode: {
+            step: statistics.median(step_timings["wall"] for step_timings in mode_timings[step])
+            for step in mode_timings
+        }
+        for load_mode, mode_timings in timings.items()
+    }
+    print("| **Step** | {} |".format(" | ".join(load_modes)))
+    print("| :------- | {} |".format(" | ".join("-------:" for _ in load_modes)))
+    for step in medians[load_modes[0]]:
+        print(
+            "| {} | {} |".format(
+                step,
+                " | ".join("{:.3f}s".format(medians[load_mode][step]) for load_mode in load_modes),
+            )
+        )
+    print(
+        "| total | {} |".format(
+            " | ".join("{:.3f}s".format(sum(medians[load_mode].values())) for load_mode in load_modes)
+        )
     )
-    query_9(conn, output_filename)
-
-    conn.close()
+    return timings
 
-    init_sql_schema(conn)
 
-
-def query_9(conn, output_filename):
+def query_9(conn, output_uri):
     conn.execute(
         """
         COPY (
@@ -121,14 +365,14 @@ def query_9(conn, output_filename):
                 o_totalprice desc,
                 o_orderdate
             limit 100
-        ) TO 's3://{}/{}' (FORMAT 'parquet');
+        ) TO '{}' (FORMAT 'parquet');
     """.format(
-            BUCKET, output_filename
+            output_uri
         )
     )
 
 
-def query_8(conn, output_filename):
+def query_8(conn, output_uri):
     conn.execute(
         """
         COPY (
@@ -162,14 +406,14 @@ def query_8(conn, output_filename):
                 p_brand,
                 p_type,
                 p_size
-        ) TO 's3://{}/{}' (FORMAT 'parquet');
+        ) TO '{}' (FORMAT 'parquet');
     """.format(
-            BUCKET, output_filename
+            output_uri
         )
     )
 
 
-def query_7(conn, output_filename):
+def query_7(conn, output_uri):
     conn.execute(
         """
         COPY (
@@ -186,14 +430,14 @@ def query_7(conn, output_filename):
                 l_partkey = p_partkey
                 and l_shipdate >= (DATE '1995-09-01')
                 and l_shipdate < (DATE '1995-09-01' + INTERVAL '1' month)
-        ) TO 's3://{}/{}' (FORMAT 'parquet');
+        ) TO '{}' (FORMAT 'parquet');
     """.format(
-            BUCKET, output_filename
+            output_uri
         )
     )
 
 
-def query_6(conn, output_filename):
+def query_6(conn, output_uri):
     conn.execute(
         """
         COPY (
@@ -225,14 +469,14 @@ def query_6(conn, output_filename):
                 l_shipmode
             order by
                 l_shipmode
-        ) TO 's3://{}/{}' (FORMAT 'parquet');
+        ) TO '{}' (FORMAT 'parquet');
     """.format(
-            BUCKET, output_filename
+            output_uri
         )
     )
 
 
-def query_5(conn, output_filename):
+def query_5(conn, output_uri):
     conn.execute(
         """
         COPY (
@@ -268,14 +512,14 @@ def query_5(conn, output_filename):
             order by
                 revenue desc
             limit 20
-        ) TO 's3://{}/{}' (FORMAT 'parquet');
+        ) TO '{}' (FORMAT 'parquet');
     """.format(
-            BUCKET, output_filename
+            output_uri
         )
     )
 
 
-def query_4(conn, output_filename):
+def query_4(conn, output_uri):
     conn.execute(
         """
         COPY (
@@ -288,14 +532,14 @@ def query_4(conn, output_filename):
             and l_shipdate < (DATE '1994-01-01' + INTERVAL '1' year)
             and l_discount between .06 - 0.01 and .06 + 0.01
             and l_quantity < 24
-        ) TO 's3://{}/{}' (FORMAT 'parquet');
+        ) TO '{}' (FORMAT 'parquet');
     """.format(
-            BUCKET, output_filename
+            output_uri
         )
     )
 
 
-def query_3(conn, output_filename):
+def query_3(conn, output_uri):
     conn.execute(
         """
         COPY (
@@ -323,14 +567,14 @@ def query_3(conn, output_filename):
                 n_name
             order by
                 revenue desc
-        ) TO 's3://{}/{}' (FORMAT 'parquet');
+        ) TO '{}' (FORMAT 'parquet');
     """.format(
-            BUCKET, output_filename
+            output_uri
         )
     )
 
 
-def query_2(conn, output_filename):
+def query_2(conn, output_uri):
     conn.execute(
         """
         COPY (
@@ -357,14 +601,14 @@ def query_2(conn, output_filename):
                 revenue desc,
                 o_orderdate
             limit 10
-        ) TO 's3://{}/{}' (FORMAT 'parquet');
+        ) TO '{}' (FORMAT 'parquet');
     """.format(
-            BUCKET, output_filename
+            output_uri
         )
     )
 
 
-def query_1(conn, output_filename):
+def query_1(conn, output_uri):
     conn.execute(
         """
         COPY (
@@ -389,40 +633,83 @@ def query_1(conn, output_filename):
             order by
                 l_returnflag,
                 l_linestatus
-        ) TO 's3://{}/{}' (FORMAT 'parquet');
+        ) TO '{}' (FORMAT 'parquet');
     """.format(
-            BUCKET, output_filename
+            output_uri
         )
     )
 
 
-def load_table_from_parquet(conn, bucket, scale_factor, table_name):
-    customer_uri = "s3://{}/tpc-h/{}/raw/{}.parquet".format(
-        bucket, scale_factor, table_name
+def table_source(conn, scale_factor, table_name):
+    table_uri = "{}/tpc-h/{}/raw/{}.parquet".format(
+        STORAGE_ROOT, scale_factor, table_name
+    )
+    # hive partitioned tables written by generate_data.py --partition-by are directories
+    partitions_uri = "{}/**/*.parquet".format(table_uri)
+    if conn.execute("SELECT count(*) FROM glob(?)", [partitions_uri]).fetchone()[0] > 0:
+        return partitions_uri
+    return table_uri
+
+
+def load_table_from_parquet(conn, scale_factor, table_name):
+    # BY NAME, as the partition columns come last when reading a hive partitioned table
+    conn.execute(
+        """
+        INSERT INTO {} BY NAME (SELECT * FROM read_parquet('{}', hive_partitioning = true));
+    """.format(
+            table_name, table_source(conn, scale_factor, table_name)
+        )
     )
+
+
+def create_view_from_parquet(conn, scale_factor, table_name):
     conn.execute(
         """
-        INSERT INTO {} (SELECT * FROM read_parquet('{}'));
+        CREATE OR REPLACE VIEW {} AS (SELECT * FROM read_parquet('{}', hive_partitioning = true));
     """.format(
-            table_name, customer_uri
+            table_name, table_source(conn, scale_factor, table_name)
         )
     )
 
 
+def load_table_if_changed(conn, scale_factor, table_name):
+    # read_blob only fetches the file metadata as long as the content column is not selected
+    source_version = conn.execute(
+        "SELECT sum(size)::BIGINT, max(last_modified)::TIMESTAMP FROM read_blob(?)",
+        [table_source(conn, scale_factor, table_name)],
+    ).fetchone()
+    loaded_version = conn.execute(
+        "SELECT FILE_SIZE, LAST_MODIFIED FROM SOURCE_FILE WHERE TABLE_NAME = ?",
+        [table_name],
+    ).fetchone()
+    if loaded_version == source_version:
+        print("Table {} is up to date, skipping the load".format(table_name))
+        return
+
+    conn.begin()
+    conn.execute("DELETE FROM {}".format(table_name))
+    load_table_from_parquet(conn, scale_factor, table_name)
+    conn.execute(
+        "INSERT OR REPLACE INTO SOURCE_FILE VALUES (?, ?, ?)",
+        [table_name, *source_version],
+    )
+    conn.commit()
+
+
 def init_sql_schema(duckdb_conn):
     # copied straight from dss.dll from the TPC-H repo
     duckdb_conn.execute(
         """
-        CREATE TABLE NATION  ( N_NATIONKEY  INTEGER NOT NULL,
+        CREATE TABLE IF NOT EXISTS NATION  ( N_NATIONKEY  INTEGER NOT NULL,
                             N_NAME       CHAR(25) NOT NULL,
                             N_REGIONKEY  INTEGER NOT NULL,
                             N_COMMENT    VARCHAR(152));
 
-        CREATE TABLE REGION  ( R_REGIONKEY  INTEGER NOT NULL,
+        CREATE TABLE IF NOT EXISTS REGION  ( R_REGIONKEY  INTEGER NOT NULL,
                                     R_NAME       CHAR(25) NOT NULL,
                                     R_COMMENT    VARCHAR(152));
 
-        CREATE TABLE PART  ( P_PARTKEY     INTEGER NOT NULL,
+        CREATE TABLE IF NOT EXISTS PART  ( P_PARTKEY     INTEGER NOT NULL,
                                 P_NAME        VARCHAR(55) NOT NULL,
                                 P_MFGR        CHAR(25) NOT NULL,
                                 P_BRAND       CHAR(10) NOT NULL,
@@ -432,7 +719,7 @@ def init_sql_schema(duckdb_conn):
                                 P_RETAILPRICE DECIMAL(15,2) NOT NULL,
                                 P_COMMENT     VARCHAR(23) NOT NULL );
 
-        CREATE TABLE SUPPLIER ( S_SUPPKEY     INTEGER NOT NULL,
+        CREATE TABLE IF NOT EXISTS SUPPLIER ( S_SUPPKEY     INTEGER NOT NULL,
                                     S_NAME        CHAR(25) NOT NULL,
                                     S_ADDRESS     VARCHAR(40) NOT NULL,
                                     S_NATIONKEY   INTEGER NOT NULL,
@@ -440,13 +727,13 @@ def init_sql_schema(duckdb_conn):
                                     S_ACCTBAL     DECIMAL(15,2) NOT NULL,
                                     S_COMMENT     VARCHAR(101) NOT NULL);
 
-        CREATE TABLE PARTSUPP ( PS_PARTKEY     INTEGER NOT NULL,
+        CREATE TABLE IF NOT EXISTS PARTSUPP ( PS_PARTKEY     INTEGER NOT NULL,
                                     PS_SUPPKEY     INTEGER NOT NULL,
                                     PS_AVAILQTY    INTEGER NOT NULL,
                                     PS_SUPPLYCOST  DECIMAL(15,2)  NOT NULL,
                                     PS_COMMENT     VARCHAR(199) NOT NULL );
 
-        CREATE TABLE CUSTOMER ( C_CUSTKEY     INTEGER NOT NULL,
+        CREATE TABLE IF NOT EXISTS CUSTOMER ( C_CUSTKEY     INTEGER NOT NULL,
                                     C_NAME        VARCHAR(25) NOT NULL,
                                     C_ADDRESS     VARCHAR(40) NOT NULL,
                                     C_NATIONKEY   INTEGER NOT NULL,
@@ -455,7 +742,7 @@ def init_sql_schema(duckdb_conn):
                                     C_MKTSEGMENT  CHAR(10) NOT NULL,
                                     C_COMMENT     VARCHAR(117) NOT NULL);
 
-        CREATE TABLE ORDERS  ( O_ORDERKEY       INTEGER NOT NULL,
+        CREATE TABLE IF NOT EXISTS ORDERS  ( O_ORDERKEY       INTEGER NOT NULL,
                                 O_CUSTKEY        INTEGER NOT NULL,
                                 O_ORDERSTATUS    CHAR(1) NOT NULL,
                                 O_TOTALPRICE     DECIMAL(15,2) NOT NULL,
@@ -465,7 +752,7 @@ def init_sql_schema(duckdb_conn):
                                 O_SHIPPRIORITY   INTEGER NOT NULL,
                                 O_COMMENT        VARCHAR(79) NOT NULL);
 
-        CREATE TABLE LINEITEM ( L_ORDERKEY    INTEGER NOT NULL,
+        CREATE TABLE IF NOT EXISTS LINEITEM ( L_ORDERKEY    INTEGER NOT NULL,
                                     L_PARTKEY     INTEGER NOT NULL,
                                     L_SUPPKEY     INTEGER NOT NULL,
                                     L_LINENUMBER  INTEGER NOT NULL,
@@ -481,10 +768,86 @@ def init_sql_schema(duckdb_conn):
                                     L_SHIPINSTRUCT CHAR(25) NOT NULL,
                                     L_SHIPMODE     CHAR(10) NOT NULL,
                                     L_COMMENT      VARCHAR(44) NOT NULL);
+
+        -- size and modification time of the parquet file each table was loaded from
+        CREATE TABLE IF NOT EXISTS SOURCE_FILE ( TABLE_NAME     VARCHAR PRIMARY KEY,
+                                    FILE_SIZE      BIGINT NOT NULL,
+                                    LAST_MODIFIED  TIMESTAMP NOT NULL);
     """
     )
     return
 
 
+def parse_query_numbers(queries):
+    # e.g. "1-9", "4" or "1,3,5-7"
+    query_numbers = []
+    for query_range in queries.split(","):
+        first, _, last = query_range.partition("-")
+        query_numbers.extend(range(int(first), int(last or first) + 1))
+    return query_numbers
+
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run the TPC-H queries on DuckDB")
+    parser.add_argument("--scale", default="1g", help="scale factor")
+    parser.add_argument("--queries", default="1-9", help="queries, e.g. 1-9 or 1,3,5")
+    parser.add_argument(
+        "--repetitions", type=int, default=1, help="measured runs of each query"
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=0, help="runs of each query before the measured ones"
+    )
+    parser.add_argument("--threads", type=int, help="threads used by DuckDB")
+    parser.add_argument("--memory-limit", help="memory limit of DuckDB, e.g. 8GB")
+    parser.add_argument(
+        "--temp-directory", help="directory the data that does not fit in memory is spilled to"
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="save the time spent in each operator"
+    )
+    parser.add_argument(
+        "--load-mode", choices=["memory", "persistent", "parquet"], default="memory"
+    )
+    parser.add_argument(
+        "--parallelism",
+        type=int,
+        default=1,
+        help="queries running concurrently, they share the memory limit, the threads and the measured memory",
+    )
+    parser.add_argument(
+        "--compare-load-modes",
+        nargs="+",
+        choices=["memory", "persistent", "parquet"],
+        help="run the queries with each of these load modes and print a comparison, e.g. memory parquet",
+    )
+    parser.add_argument(
+        "--timings-output", help="JSON file the timings of the measured runs are written to"
+    )
+    args = parser.parse_args()
+
+    options = dict(
+        parallelism=args.parallelism,
+        memory_limit=args.memory_limit,
+        threads=args.threads,
+        repetitions=args.repetitions,
+        warmup=args.warmup,
+        temp_directory=args.temp_directory,
+        profile=args.profile,
+    )
+    if args.compare_load_modes:
+        timings = compare_load_modes(
+            args.scale,
+            parse_query_numbers(args.queries),
+            args.compare_load_modes,
+            **options,
+        )
+    else:
+        timings = main(
+            scale_factor=args.scale,
+            query_numbers=parse_query_numbers(args.queries),
+            load_mode=args.load_mode,
+            **options,
+        )
+    if args.timings_output:
+        with open(args.timings_output, "w") as f:
+            json.dump(timings, f)
@@ -0,0 +1,135 @@
+import argparse
+import duckdb
+import importlib.util
+import os
+
+# Same storage root as the pipelines: a S3 bucket (s3://...) or a local directory
+STORAGE_ROOT = os.environ.get("TPC_H_STORAGE", "s3://windmill")
+TABLES = [
+    "customer",
+    "orders",
+    "lineitem",
+    "supplier",
+    "part",
+    "partsupp",
+    "nation",
+    "region",
+]
+
+
+def main(scale_factor, row_group_size, partitions, database, children):
+    conn = duckdb.connect(database)
+    connect_storage(conn)
+    conn.execute("INSTALL 'tpch'; LOAD 'tpch';")
+
+    # Large scale factors are generated in several steps, each one appending a chunk of the data to the tables
+    for step in range(children):
+        print("Generating TPC-H data for SF{} ({}/{})".format(scale_factor, step + 1, children))
+        conn.execute(
+            "CALL dbgen(sf={}, children={}, step={});".format(scale_factor, children, step)
+        )
+
+    for table_name in TABLES:
+        table_uri = "{}/tpc-h/{}/raw/{}.parquet".format(
+            STORAGE_ROOT, scale_name(scale_factor), table_name
+        )
+        if not STORAGE_ROOT.startswith("s3://"):
+            os.makedirs(os.path.dirname(table_uri), exist_ok=True)
+
+        copy_options = ["FORMAT 'parquet'", "ROW_GROUP_SIZE {}".format(row_group_size)]
+        if table_name in partitions:
+            # written as a hive partitioned directory: <table>.parquet/<column>=<value>/data_0.parquet
+            copy_options.append("PARTITION_BY ({})".format(partitions[table_name]))
+            copy_options.append("OVERWRITE_OR_IGNORE")
+
+        print("Writing {} to {}".format(table_name, table_uri))
+        conn.execute(
+            """
+            COPY (SELECT {} FROM {}) TO '{}' ({});
+        """.format(
+                select_columns(conn, table_name),
+                table_name,
+                table_uri,
+                ", ".join(copy_options),
+            )
+        )
+
+    conn.close()
+
+
+def select_columns(conn, table_name):
+    # The queries use upper case column names, and decimals are stored as doubles like in the original datasets
+    columns = []
+    for column_name, column_type, *_ in conn.execute(
+        "DESCRIBE {}".format(table_name)
+    ).fetchall():
+        if column_type.startswith("DECIMAL"):
+            columns.append("{}::DOUBLE AS {}".format(column_name, column_name.upper()))
+        else:
+            columns.append("{} AS {}".format(column_name, column_name.upper()))
+    return ", ".join(columns)
+
+
+def scale_name(scale_factor):
+    # 1 -> 1g, 10 -> 10g, 0.1 -> 100m
+    if scale_factor >= 1:
+        return "{:g}g".format(scale_factor)
+    return "{:g}m".format(scale_factor * 1000)
+
+
+def connect_storage(conn):
+    if not STORAGE_ROOT.startswith("s3://"):
+        return
+
+    # The DuckDB pipeline is deployed as a single file, its S3 connection is loaded from it rather than moved to a
+    # module that it would have to import
+    spec = importlib.util.spec_from_file_location(
+        "duckdb_tpc_h", os.path.join(os.path.dirname(os.path.abspath(__file__)), "duckdb", "tpc_h.py")
+    )
+    duckdb_tpc_h = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(duckdb_tpc_h)
+    duckdb_tpc_h.connect_s3(conn)
+
+
+def parse_partitions(partitions):
+    # e.g. ["lineitem=L_RETURNFLAG", "orders=O_ORDERSTATUS,O_ORDERPRIORITY"]
+    return dict(partition.split("=", 1) for partition in partitions)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the TPC-H datasets")
+    parser.add_argument(
+        "--scale-factor", type=float, default=1, help="scale factor, e.g. 0.1, 1, 10 or 100"
+    )
+    parser.add_argument(
+        "--row-group-size",
+        type=int,
+        default=122880,
+        help="number of rows per parquet row group",
+    )
+    parser.add_argument(
+        "--partition-by",
+        nargs="*",
+        default=[],
+        help="hive partitioning of some tables, e.g. lineitem=L_RETURNFLAG",
+    )
+    parser.add_argument(
+        "--database",
+        default=":memory:",
+        help="DuckDB database used to generate the data, use a file for large scale factors",
+    )
+    parser.add_argument(
+        "--children",
+        type=int,
+        default=1,
+        help="number of steps the data is generated in, to limit the memory used",
+    )
+    args = parser.parse_args()
+
+    main(
+        args.scale_factor,
+        args.row_group_size,
+        parse_partitions(args.partition_by),
+        args.database,
+        args.children,
+    )
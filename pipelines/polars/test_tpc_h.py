@@ -0,0 +1,82 @@
+import datetime
+import polars as pl
+import pyarrow.parquet as pq
+import pytest
+import tpc_h
+
+old_streaming_engine = pytest.mark.skipif(
+    tpc_h.STREAMING_ENGINE, reason="the new streaming engine doesn't show the streamed parts of the plans"
+)
+streaming_graph = pytest.mark.skipif(
+    not tpc_h.STREAMING_GRAPH, reason="the physical plan of the streaming engine is shown from Polars 1.29"
+)
+
+
+@pytest.fixture
+def lineitem(tmp_path):
+    pl.DataFrame(
+        {
+            "L_RETURNFLAG": ["A", "N", "R"],
+            "L_LINESTATUS": ["F", "O", "F"],
+            "L_QUANTITY": [1.0, 2.0, 3.0],
+            "L_EXTENDEDPRICE": [10.0, 20.0, 30.0],
+            "L_DISCOUNT": [0.1, 0.0, 0.05],
+            "L_TAX": [0.0, 0.02, 0.08],
+            "L_SHIPDATE": [datetime.datetime(1995, 1, 1)] * 3,
+        }
+    ).write_parquet(tmp_path / "lineitem.parquet")
+    return pl.scan_parquet(tmp_path / "lineitem.parquet")
+
+
+@old_streaming_engine
+def test_fully_streamed_query(lineitem):
+    assert tpc_h.find_in_memory_operators(tpc_h.query_1(lineitem)) == []
+
+
+@old_streaming_engine
+def test_operators_in_memory(lineitem):
+    query = lineitem.with_columns(
+        pl.col("L_QUANTITY").rank().over("L_RETURNFLAG")
+    ).group_by("L_RETURNFLAG").agg(pl.col("L_QUANTITY").sum())
+    assert tpc_h.find_in_memory_operators(query) == ["AGGREGATE", "WITH_COLUMNS"]
+
+
+@streaming_graph
+def test_fallback_nodes(lineitem):
+    query = lineitem.with_columns(
+        pl.col("L_QUANTITY").rank().over("L_RETURNFLAG")
+    ).group_by("L_RETURNFLAG").agg(pl.col("L_QUANTITY").sum())
+    # the operation of the node is only shown from Polars 1.30
+    assert [operator.split(" (")[0] for operator in tpc_h.find_in_memory_operators(query)] == ["in-memory-map"]
+
+
+def test_parse_fallback_nodes():
+    graph = (
+        'digraph polars {\n'
+        'label=<<B>Legend</B><BR/><BR/>◯ streaming engine node <FONT COLOR="0.16 0.3 1.0">⬤</FONT> potentially '
+        'memory-intensive node <FONT COLOR="0.0 0.3 1.0">⬤</FONT> in-memory engine fallback>\n'
+        '3 [label="group-by\\nkey:\\n",style=filled,fillcolor="0.16 0.3 1.0"];\n'
+        '2 [label="in-memory-map\nSELECT [\\n_TMP = col(\\"b\\").rank()\\n]",style=filled,fillcolor="0.0 0.3 1.0"];\n'
+        '1 [label="in-memory-source\\ncols: a, b",style=filled,fillcolor="0.16 0.3 1.0"];\n'
+        '}\n'
+    )
+    assert tpc_h.parse_fallback_nodes(graph) == ["in-memory-map (SELECT)"]
+    assert tpc_h.parse_fallback_nodes("digraph polars {\n}\n") is None
+
+
+def test_in_memory_plan():
+    plan = 'AGGREGATE\n\t[col("b").sum()] BY [col("c")] FROM\n  DF ["b", "c"]; PROJECT 2/2 COLUMNS\n'
+    assert tpc_h.parse_in_memory_operators(plan) is None
+
+
+def test_no_engine_option_without_streaming():
+    assert tpc_h.engine_options(False) == {}
+
+
+def test_write_row_groups(tmp_path, monkeypatch):
+    monkeypatch.setattr(tpc_h, "ROW_GROUP_SIZE", 2)
+    dataset = pl.DataFrame({"a": [1, 2, 3, 4, 5], "b": ["v", "w", "x", "y", "z"]})
+    with open(tmp_path / "output.parquet", "wb") as output_file:
+        tpc_h.write_row_groups(dataset, output_file)
+    assert pq.ParquetFile(tmp_path / "output.parquet").num_row_groups == 3
+    assert pl.read_parquet(tmp_path / "output.parquet").equals(dataset)
@@ -1,134 +1,485 @@
+import argparse
+import ast
+import inspect
+import json
 import os
+import fsspec
 import polars as pl
+import pyarrow.parquet as pq
+import re
 import s3fs
+import sys
+import threading
+import time
 import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# Root of the TPC-H datasets: a S3 bucket (s3://...) or a local directory. The S3 endpoint can be overridden with
+# S3_ENDPOINT_URL, for example to use MinIO
+STORAGE_ROOT = os.environ.get("TPC_H_STORAGE", "s3://windmill")
+TABLES = [
+    "customer",
+    "orders",
+    "lineitem",
+    "part",
+    "supplier",
+    "partsupp",
+    "nation",
+    "region",
+]
+# Queries collected together in concurrent mode. Queries 1, 4, 6 and 7 share the lineitem scan, queries 2, 3, 5
+# and 9 share the customer/orders/lineitem joins.
+QUERY_GROUPS = [[1, 4, 6, 7], [2, 3, 5, 9], [8]]
+# The query results are encoded row group by row group, and uploaded to S3 in parts of UPLOAD_PART_SIZE_MB as they are
+# encoded, UPLOAD_CONCURRENCY parts at a time, instead of encoding the whole parquet file in memory before the upload
+ROW_GROUP_SIZE = int(os.environ.get("TPC_H_ROW_GROUP_SIZE", "122880"))
+UPLOAD_PART_SIZE = int(os.environ.get("TPC_H_UPLOAD_PART_SIZE_MB", "16")) * 1024**2
+UPLOAD_CONCURRENCY = int(os.environ.get("TPC_H_UPLOAD_CONCURRENCY", "4"))
+# Polars 1.25 replaced the streaming=True argument with the new streaming engine, selected with engine="streaming"
+POLARS_VERSION = tuple(int(part) for part in pl.__version__.split(".")[:2])
+STREAMING_ENGINE = POLARS_VERSION >= (1, 25)
+# The physical plan of the new streaming engine, which marks the nodes that fall back to memory, is shown from 1.29
+STREAMING_GRAPH = POLARS_VERSION >= (1, 29)
+
+
+def main(
+    scale_factor="1g",
+    query_numbers=None,
+    scan=True,
+    concurrent=False,
+    upload_workers=4,
+    repetitions=1,
+    warmup=0,
+    streaming=False,
+    profile=False,
+):
+    query_numbers = query_numbers or range(1, 10)
+
+    for query_name, line_number in find_early_collects():
+        print(
+            "Warning: {} collects an intermediate result (line {})".format(
+                query_name, line_number
+            )
+        )
 
+    fs = file_system()
 
-def main():
-    bucket = "windmill"
-    args = {
-        "anon": False,
-        # "endpoint_url": "http://localhost:9050", # if not AWS default, for example if using MinIO
-        "key": os.environ.get("AWS_ACCESS_KEY"),
-        "secret": os.environ.get("AWS_SECRET_KEY"),
-        "use_ssl": False,
-        "cache_regions": False,
-        "client_kwargs": {
-            "region_name": os.environ.get("AWS_REGION"),
-        },
+    # With scan=True, tables are lazily scanned from S3 and each query only fetches the columns and row
+    # groups it needs. With scan=False, every table is fully downloaded and loaded in memory upfront.
+    tables = {
+        table_name: load_dataset(fs, scale_factor, table_name, scan)
+        for table_name in TABLES
     }
-    s3 = s3fs.S3FileSystem(**args)
-    scale_factor = "1g"
 
-    orders_uri = "s3://{}/tpc-h/{}/raw/{}".format(
-        bucket, scale_factor, "orders.parquet"
-    )
-    customer_uri = "s3://{}/tpc-h/{}/raw/{}".format(
-        bucket, scale_factor, "customer.parquet"
-    )
-    lineitem_uri = "s3://{}/tpc-h/{}/raw/{}".format(
-        bucket, scale_factor, "lineitem.parquet"
-    )
-    part_uri = "s3://{}/tpc-h/{}/raw/{}".format(bucket, scale_factor, "part.parquet")
-    supplier_uri = "s3://{}/tpc-h/{}/raw/{}".format(
-        bucket, scale_factor, "supplier.parquet"
-    )
-    partsupp_uri = "s3://{}/tpc-h/{}/raw/{}".format(
-        bucket, scale_factor, "partsupp.parquet"
-    )
-    nation_uri = "s3://{}/tpc-h/{}/raw/{}".format(
-        bucket, scale_factor, "nation.parquet"
-    )
-    region_uri = "s3://{}/tpc-h/{}/raw/{}".format(
-        bucket, scale_factor, "region.parquet"
-    )
-
-    with s3.open(lineitem_uri, mode="rb") as lineitem_ipt, s3.open(
-        part_uri, mode="rb"
-    ) as part_ipt, s3.open(supplier_uri, mode="rb") as supplier_ipt, s3.open(
-        partsupp_uri, mode="rb"
-    ) as partsupp_ipt, s3.open(
-        nation_uri, mode="rb"
-    ) as nation_ipt, s3.open(
-        region_uri, mode="rb"
-    ) as region_ipt, s3.open(
-        customer_uri, mode="rb"
-    ) as customer_ipt, s3.open(
-        orders_uri, mode="rb"
-    ) as orders_ipt:
-        lineitem = pl.read_parquet(lineitem_ipt).lazy()
-        part = pl.read_parquet(part_ipt).lazy()
-        supplier = pl.read_parquet(supplier_ipt).lazy()
-        partsupp = pl.read_parquet(partsupp_ipt).lazy()
-        nation = pl.read_parquet(nation_ipt)
-        region = pl.read_parquet(region_ipt).lazy()
-        customer = pl.read_parquet(customer_ipt).lazy()
-        orders = pl.read_parquet(orders_ipt).lazy()
-
-        output_uri = "{}/{}/output-polars/{}.parquet".format(
-            bucket, scale_factor, "query_1"
+    if streaming and STREAMING_ENGINE and not STREAMING_GRAPH:
+        # The plans of the new streaming engine only show the operators that fall back to memory from 1.29
+        print(
+            "Polars {}: the queries run with the streaming engine, no report of the operators that fall back "
+            "to memory before Polars 1.29".format(pl.__version__)
         )
-        with s3.open(output_uri, mode="wb") as output_file:
-            output_df = query_1(lineitem)
-            output_df.write_parquet(output_file)
+    elif streaming:
+        # The streaming engine processes the scanned parquet files in batches, the operators it does not support
+        # run in memory on the result of the streaming part of the plan
+        for query_number in query_numbers:
+            in_memory_operators = find_in_memory_operators(build_query(query_number, tables))
+            if in_memory_operators is None and STREAMING_ENGINE:
+                print("query_{}: no report of the operators that fall back to memory".format(query_number))
+            elif in_memory_operators is None:
+                print("query_{}: runs in memory".format(query_number))
+            elif in_memory_operators:
+                print(
+                    "query_{}: streaming, falls back to memory for {}".format(
+                        query_number, ", ".join(in_memory_operators)
+                    )
+                )
+            else:
+                print("query_{}: streaming".format(query_number))
+
+    # The warmup runs are not measured. In concurrent mode, the queries are measured all together.
+    timings = {}
+    for repetition in range(warmup + repetitions):
+        if concurrent:
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            run_concurrently(
+                fs, scale_factor, tables, query_numbers, upload_workers, streaming
+            )
+            measured = {"concurrent": measure_since(wall_start, cpu_start)}
+        else:
+            measured = {}
+            for query_number in query_numbers:
+                wall_start, cpu_start = time.perf_counter(), time.process_time()
+                query = build_query(query_number, tables)
+                if profile:
+                    # The profile is saved next to the result, the profiling adds a small overhead
+                    output_df, profile_df = query.profile(**engine_options(streaming))
+                    write_profile(
+                        fs,
+                        scale_factor,
+                        profile_operators(profile_df, query_number),
+                        query_number,
+                    )
+                else:
+                    output_df = query.collect(**engine_options(streaming))
+                write_dataset(fs, scale_factor, output_df, query_number)
+                measured["query_{}".format(query_number)] = measure_since(
+                    wall_start, cpu_start
+                )
+        if repetition < warmup:
+            continue
+        for query_name, query_timings in measured.items():
+            print(
+                "{}: {:.3f}s wall, {:.3f}s cpu".format(
+                    query_name, query_timings["wall"], query_timings["cpu"]
+                )
+            )
+            timings.setdefault(query_name, []).append(query_timings)
 
-        output_uri = "{}/{}/output-polars/{}.parquet".format(
-            bucket, scale_factor, "query_2"
-        )
-        with s3.open(output_uri, mode="wb") as output_file:
-            output_df = query_2(customer, orders, lineitem)
-            output_df.write_parquet(output_file)
+    return timings
 
-        output_uri = "{}/{}/output-polars/{}.parquet".format(
-            bucket, scale_factor, "query_3"
-        )
-        with s3.open(output_uri, mode="wb") as output_file:
-            output_df = query_3(customer, orders, lineitem, supplier, nation, region)
-            output_df.write_parquet(output_file)
 
-        output_uri = "{}/{}/output-polars/{}.parquet".format(
-            bucket, scale_factor, "query_4"
-        )
-        with s3.open(output_uri, mode="wb") as output_file:
-            output_df = query_4(lineitem)
-            output_df.write_parquet(output_file)
+def engine_options(streaming):
+    # No option is passed without streaming, the argument was removed in Polars 2.0
+    if not streaming:
+        return {}
+    if STREAMING_ENGINE:
+        return {"engine": "streaming"}
+    return {"streaming": True}
 
-        output_uri = "{}/{}/output-polars/{}.parquet".format(
-            bucket, scale_factor, "query_5"
-        )
-        with s3.open(output_uri, mode="wb") as output_file:
-            output_df = query_5(customer, orders, lineitem, nation)
-            output_df.write_parquet(output_file)
 
-        output_uri = "{}/{}/output-polars/{}.parquet".format(
-            bucket, scale_factor, "query_6"
+def find_in_memory_operators(query):
+    if STREAMING_ENGINE:
+        return parse_fallback_nodes(
+            query.show_graph(engine="streaming", plan_stage="physical", raw_output=True, show=False)
         )
-        with s3.open(output_uri, mode="wb") as output_file:
-            output_df = query_6(orders, lineitem)
-            output_df.write_parquet(output_file)
+    return parse_in_memory_operators(query.explain(streaming=True))
+
+
+def parse_fallback_nodes(graph):
+    # The physical plan of the new streaming engine is a graphviz graph, whose legend gives the color of the nodes
+    # that fall back to the in-memory engine. Each of them is reported with the operation it runs, e.g.
+    # "in-memory-map (SELECT)". Returns None when the graph has no legend to find them.
+    fallback_color = re.search(r'<FONT COLOR="([^"]+)">⬤</FONT>\s*in-memory engine fallback', graph)
+    if fallback_color is None:
+        return None
+    in_memory_operators = []
+    for label, color in re.findall(r'\[label="((?:[^"\\]|\\.)*)"(?:,style=filled,fillcolor="([^"]*)")?\]', graph):
+        if color != fallback_color.group(1):
+            continue
+        node, *details = re.split(r"\n|\\n", label)
+        operation = re.match(r"[A-Z][A-Z_ ]*[A-Z]", details[0]) if details else None
+        operator = "{} ({})".format(node, operation.group(0)) if operation else node
+        if operator not in in_memory_operators:
+            in_memory_operators.append(operator)
+    return in_memory_operators
+
+
+def parse_in_memory_operators(plan):
+    # The streaming parts of the plan are the lines indented under a "STREAMING:" line, the operators outside of them
+    # run in memory. Returns None when no part of the plan is streamed.
+    in_memory_operators = []
+    streamed = False
+    streaming_indent = None
+    for line in plan.splitlines():
+        indent = len(line) - len(line.lstrip())
+        line = line.strip()
+        if not line:
+            continue
+        if streaming_indent is not None and indent > streaming_indent:
+            continue
+        streaming_indent = None
+        if line.startswith("STREAMING:"):
+            streamed = True
+            streaming_indent = indent
+            continue
+        # the sides of the joins, the in-memory tables and the columns and filters of the scans are not operators
+        if line.startswith(("LEFT PLAN", "RIGHT PLAN", "END ", "PROJECT", "SELECTION", "DF ")):
+            continue
+        operator = re.match(r"[A-Z][A-Z_ ]*[A-Z]", line)
+        if operator and operator.group(0) not in in_memory_operators:
+            in_memory_operators.append(operator.group(0))
+    return in_memory_operators if streamed else None
+
+
+def measure_since(wall_start, cpu_start):
+    return {
+        "wall": time.perf_counter() - wall_start,
+        "cpu": time.process_time() - cpu_start,
+    }
 
-        output_uri = "{}/{}/output-polars/{}.parquet".format(
-            bucket, scale_factor, "query_7"
-        )
-        with s3.open(output_uri, mode="wb") as output_file:
-            output_df = query_7(lineitem, part)
-            output_df.write_parquet(output_file)
 
-        output_uri = "{}/{}/output-polars/{}.parquet".format(
-            bucket, scale_factor, "query_8"
+def run_concurrently(
+    fs, scale_factor, tables, query_numbers, upload_workers, streaming=False
+):
+    # Each group is evaluated as a single plan by pl.collect_all, so the sub-plans shared by its queries are
+    # only computed once. Uploads of a group run in background threads while the next group is computed.
+    with ThreadPoolExecutor(max_workers=upload_workers) as executor:
+        uploads = []
+        for query_group in QUERY_GROUPS:
+            query_group = [
+                query_number
+                for query_number in query_group
+                if query_number in query_numbers
+            ]
+            if not query_group:
+                continue
+            output_dfs = pl.collect_all(
+                [build_query(query_number, tables) for query_number in query_group],
+                **engine_options(streaming),
+            )
+            for query_number, output_df in zip(query_group, output_dfs):
+                uploads.append(
+                    executor.submit(
+                        write_dataset, fs, scale_factor, output_df, query_number
+                    )
+                )
+        for upload in uploads:
+            upload.result()
+
+
+def build_query(query_number, tables):
+    match query_number:
+        case 1:
+            return query_1(tables["lineitem"])
+        case 2:
+            return query_2(tables["customer"], tables["orders"], tables["lineitem"])
+        case 3:
+            return query_3(
+                tables["customer"],
+                tables["orders"],
+                tables["lineitem"],
+                tables["supplier"],
+                tables["nation"],
+                tables["region"],
+            )
+        case 4:
+            return query_4(tables["lineitem"])
+        case 5:
+            return query_5(
+                tables["customer"], tables["orders"], tables["lineitem"], tables["nation"]
+            )
+        case 6:
+            return query_6(tables["orders"], tables["lineitem"])
+        case 7:
+            return query_7(tables["lineitem"], tables["part"])
+        case 8:
+            return query_8(tables["partsupp"], tables["part"], tables["supplier"])
+        case 9:
+            return query_9(tables["customer"], tables["orders"], tables["lineitem"])
+
+
+def find_early_collects():
+    # The query functions must return lazy plans. A collect() inside of them materializes an intermediate
+    # result before the rest of the query is planned: nothing can be pushed down through it and it cannot be
+    # shared with other queries by pl.collect_all.
+    early_collects = []
+    for query_number in range(1, 10):
+        query_name = "query_{}".format(query_number)
+        source_lines, first_line = inspect.getsourcelines(globals()[query_name])
+        for node in ast.walk(ast.parse("".join(source_lines))):
+            if (
+                isinstance(node, ast.Call)
+                and isinstance(node.func, ast.Attribute)
+                and node.func.attr in ["collect", "collect_all", "fetch"]
+            ):
+                early_collects.append((query_name, first_line + node.func.end_lineno - 1))
+    return early_collects
+
+
+def load_dataset(fs, scale_factor, dataset_name, scan):
+    dataset_uri = "{}/tpc-h/{}/raw/{}.parquet".format(
+        STORAGE_ROOT, scale_factor, dataset_name
+    )
+    if fs.isdir(dataset_uri):
+        # hive partitioned table written by generate_data.py --partition-by
+        dataset = pl.scan_parquet(
+            "{}/**/*.parquet".format(dataset_uri),
+            hive_partitioning=True,
+            storage_options=storage_options(),
         )
-        with s3.open(output_uri, mode="wb") as output_file:
-            output_df = query_8(partsupp, part, supplier)
-            output_df.write_parquet(output_file)
+        return dataset if scan else dataset.collect().lazy()
+    if scan:
+        return pl.scan_parquet(dataset_uri, storage_options=storage_options())
+    with fs.open(dataset_uri, mode="rb") as dataset_ipt:
+        return pl.read_parquet(dataset_ipt).lazy()
+
 
-        output_uri = "{}/{}/output-polars/{}.parquet".format(
-            bucket, scale_factor, "query_9"
+def write_dataset(fs, scale_factor, dataset, query_number):
+    output_uri = "{}/tpc-h/{}/output-polars/query_{}.parquet".format(
+        STORAGE_ROOT, scale_factor, query_number
+    )
+    if output_uri.startswith("s3://"):
+        output_file = MultipartUpload(fs, output_uri)
+    else:
+        output_file = fs.open(output_uri, mode="wb")
+    with output_file:
+        write_row_groups(dataset, output_file)
+
+
+def profile_operators(profile_df, query_number):
+    # Same schema as the DuckDB profiles. Polars reports when each node of the plan started and ended, in
+    # microseconds, not the number of rows they produced.
+    return [
+        {
+            "engine": "polars",
+            "query": query_number,
+            "operator_id": operator_id,
+            "parent_id": None,
+            "operator": node,
+            "time_s": (end - start) / 1e6,
+            "rows": None,
+            "detail": None,
+        }
+        for operator_id, (node, start, end) in enumerate(profile_df.iter_rows())
+    ]
+
+
+def write_profile(fs, scale_factor, operators, query_number):
+    profile_uri = "{}/tpc-h/{}/output-polars/query_{}.profile.json".format(
+        STORAGE_ROOT, scale_factor, query_number
+    )
+    with fs.open(profile_uri, mode="w") as profile_file:
+        json.dump(operators, profile_file, indent=4)
+
+
+def write_row_groups(dataset, output_file):
+    # Each slice of the result is converted to arrow and encoded on its own, and written to the file as a row group
+    with pq.ParquetWriter(output_file, dataset.head(0).to_arrow().schema) as writer:
+        for row_group in dataset.iter_slices(ROW_GROUP_SIZE):
+            writer.write_table(row_group.to_arrow())
+
+
+class MultipartUpload:
+    # File written by the parquet writer, whose content is uploaded to S3 in parts of UPLOAD_PART_SIZE as soon as they
+    # are full. Up to UPLOAD_CONCURRENCY parts are uploaded at the same time, the writes wait for a part to complete
+    # beyond that, such that the memory used is bounded by UPLOAD_PART_SIZE * (UPLOAD_CONCURRENCY + 1).
+    def __init__(self, fs, uri):
+        self.fs = fs
+        self.uri = uri
+        self.bucket, self.key, _ = fs.split_path(uri)
+        self.buffer = bytearray()
+        self.position = 0
+        self.closed = False
+        self.upload_id = None
+        self.parts = []
+        self.slots = threading.BoundedSemaphore(UPLOAD_CONCURRENCY)
+        self.executor = ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY)
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        while len(self.buffer) >= UPLOAD_PART_SIZE:
+            self.upload_part(bytes(self.buffer[:UPLOAD_PART_SIZE]))
+            del self.buffer[:UPLOAD_PART_SIZE]
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def upload_part(self, data):
+        if self.upload_id is None:
+            self.upload_id = self.fs.call_s3(
+                "create_multipart_upload", Bucket=self.bucket, Key=self.key
+            )["UploadId"]
+        self.slots.acquire()
+        part = self.executor.submit(
+            self.fs.call_s3,
+            "upload_part",
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=len(self.parts) + 1,
+            Body=data,
         )
-        with s3.open(output_uri, mode="wb") as output_file:
-            output_df = query_9(customer, orders, lineitem)
-            output_df.write_parquet(output_file)
+        part.add_done_callback(lambda _: self.slots.release())
+        self.parts.append(part)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        with self.executor:
+            if self.upload_id is None:
+                # smaller than a part, uploaded at once
+                self.fs.call_s3("put_object", Bucket=self.bucket, Key=self.key, Body=bytes(self.buffer))
+                return
+            if self.buffer:
+                # the last part can be smaller than the others
+                self.upload_part(bytes(self.buffer))
+            self.fs.call_s3(
+                "complete_multipart_upload",
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={
+                    "Parts": [
+                        {"PartNumber": part_number, "ETag": part.result()["ETag"]}
+                        for part_number, part in enumerate(self.parts, start=1)
+                    ]
+                },
+            )
+
+    def abort(self):
+        self.closed = True
+        with self.executor:
+            for part in self.parts:
+                part.cancel()
+        if self.upload_id is not None:
+            self.fs.call_s3(
+                "abort_multipart_upload", Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is not None:
+                self.abort()
+                return
+            try:
+                self.close()
+            except BaseException:
+                self.abort()
+                raise
+        finally:
+            self.fs.invalidate_cache(self.uri)
+
+
+def file_system():
+    if STORAGE_ROOT.startswith("s3://"):
+        return s3fs.S3FileSystem(**s3_args())
+    return fsspec.filesystem("file", auto_mkdir=True)
+
+
+def s3_args():
+    return {
+        "anon": False,
+        "endpoint_url": os.environ.get("S3_ENDPOINT_URL"),  # None for AWS
+        "key": os.environ.get("AWS_ACCESS_KEY"),
+        "secret": os.environ.get("AWS_SECRET_KEY"),
+        "use_ssl": False,
+        "cache_regions": False,
+        "client_kwargs": {
+            "region_name": os.environ.get("AWS_REGION"),
+        },
+    }
 
-    return
+
+def storage_options():
+    # Same credentials as s3_args(), in the format expected by Polars native object store reader
+    if not STORAGE_ROOT.startswith("s3://"):
+        return None
+    options = {
+        "aws_endpoint_url": os.environ.get("S3_ENDPOINT_URL"),
+        "aws_allow_http": str(not s3_args()["use_ssl"]).lower(),
+        "aws_access_key_id": os.environ.get("AWS_ACCESS_KEY"),
+        "aws_secret_access_key": os.environ.get("AWS_SECRET_KEY"),
+        "aws_region": os.environ.get("AWS_REGION"),
+    }
+    return {key: value for key, value in options.items() if value is not None}
 
 
 def query_9(customer, orders, lineitem):
@@ -167,22 +518,25 @@ def query_9(customer, orders, lineitem):
         o_orderdate;
     limit 100;
     """
+    # The orders are semi-joined with the large orders first, such that the join with lineitem and the
+    # aggregation only run on the few matching orders instead of the full customer/orders/lineitem join
+    large_orders = (
+        lineitem.group_by("L_ORDERKEY")
+        .agg([pl.col("L_QUANTITY").sum().alias("SUM_QTY")])
+        .filter(pl.col("SUM_QTY") > 300)
+        .select("L_ORDERKEY")
+    )
     return (
-        customer.join(orders, left_on="C_CUSTKEY", right_on="O_CUSTKEY")
+        customer.join(
+            orders.join(
+                large_orders, left_on="O_ORDERKEY", right_on="L_ORDERKEY", how="semi"
+            ),
+            left_on="C_CUSTKEY",
+            right_on="O_CUSTKEY",
+        )
         .join(lineitem, left_on="O_ORDERKEY", right_on="L_ORDERKEY")
         .group_by(["C_NAME", "C_CUSTKEY", "O_ORDERKEY", "O_ORDERDATE", "O_TOTALPRICE"])
         .agg([pl.col("L_QUANTITY").sum().alias("SUM_QTY")])
-        .collect()
-        .filter(
-            pl.col("O_ORDERKEY").is_in(
-                lineitem.group_by("L_ORDERKEY")
-                .agg([pl.col("L_QUANTITY").sum().alias("SUM_QTY")])
-                .filter(pl.col("SUM_QTY") > 300)
-                .select("L_ORDERKEY")
-                .collect()
-                .to_series()
-            )
-        )
         .sort(["O_TOTALPRICE", "O_ORDERDATE"], descending=[True, False])
         .limit(100)
     )
@@ -227,19 +581,15 @@ def query_8(partsupp, part, supplier):
         .filter(pl.col("P_BRAND") != "Brand#45")
         .filter(pl.col("P_TYPE").str.starts_with("MEDIUM POLISHED").not_())
         .filter(pl.col("P_SIZE").is_in([49, 14, 23, 45, 19, 3, 36, 9]))
-        .filter(
-            pl.col("PS_SUPPKEY")
-            .is_in(
-                supplier.filter(
-                    pl.col("S_COMMENT")
-                    .str.contains("Customer")
-                    .or_(pl.col("S_COMMENT").str.contains("Complaints"))
-                )
-                .select("S_SUPPKEY")
-                .collect()
-                .to_series()
-            )
-            .not_()
+        .join(
+            supplier.filter(
+                pl.col("S_COMMENT")
+                .str.contains("Customer")
+                .or_(pl.col("S_COMMENT").str.contains("Complaints"))
+            ),
+            left_on="PS_SUPPKEY",
+            right_on="S_SUPPKEY",
+            how="anti",
         )
         .group_by(["P_BRAND", "P_TYPE", "P_SIZE"])
         .agg([pl.col("PS_SUPPKEY").n_unique().alias("SUPPLIER_CNT")])
@@ -247,7 +597,6 @@ def query_8(partsupp, part, supplier):
             ["SUPPLIER_CNT", "P_BRAND", "P_TYPE", "P_SIZE"],
             descending=[True, False, False, False],
         )
-        .collect()
     )
 
 
@@ -288,7 +637,6 @@ def query_7(lineitem, part):
                 ).alias("PROMO_REVENUE")
             ]
         )
-        .collect()
     )
 
 
@@ -355,7 +703,6 @@ def query_6(orders, lineitem):
             ]
         )
         .sort("L_SHIPMODE")
-        .collect()
     )
 
 
@@ -424,7 +771,6 @@ def query_5(customer, orders, lineitem, nation):
         )
         .sort(["REVENUE"], descending=[True])
         .limit(20)
-        .collect()
     )
 
 
@@ -451,7 +797,6 @@ def query_4(lineitem):
         .filter(pl.col("L_QUANTITY") < 24)
         .select([(pl.col("L_EXTENDEDPRICE") * pl.col("L_DISCOUNT")).alias("REVENUE")])
         .sum()
-        .collect()
     )
 
 
@@ -504,7 +849,6 @@ def query_3(customer, orders, lineitem, supplier, nation, region):
             ]
         )
         .sort(["REVENUE"], descending=[True])
-        .collect()
     )
 
 
@@ -550,7 +894,6 @@ def query_2(customer, orders, lineitem):
         )
         .sort(["REVENUE", "O_ORDERDATE"], descending=[True, False])
         .limit(10)
-        .collect()
     )
 
 
@@ -606,9 +949,62 @@ def query_1(lineitem):
             ]
         )
         .sort(["L_RETURNFLAG", "L_LINESTATUS"])
-        .collect()
     )
 
 
+def parse_query_numbers(queries):
+    # e.g. "1-9", "4" or "1,3,5-7"
+    query_numbers = []
+    for query_range in queries.split(","):
+        first, _, last = query_range.partition("-")
+        query_numbers.extend(range(int(first), int(last or first) + 1))
+    return query_numbers
+
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run the TPC-H queries on Polars")
+    parser.add_argument("--scale", default="1g", help="scale factor")
+    parser.add_argument("--queries", default="1-9", help="queries, e.g. 1-9 or 1,3,5")
+    parser.add_argument(
+        "--repetitions", type=int, default=1, help="measured runs of each query"
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=0, help="runs of each query before the measured ones"
+    )
+    parser.add_argument("--threads", type=int, help="threads used by Polars")
+    parser.add_argument(
+        "--read", action="store_true", help="load the tables in memory instead of scanning them"
+    )
+    parser.add_argument(
+        "--concurrent", action="store_true", help="collect the queries in groups"
+    )
+    parser.add_argument(
+        "--streaming", action="store_true", help="run the queries with the streaming engine"
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="save the time spent in each operator"
+    )
+    parser.add_argument(
+        "--timings-output", help="JSON file the timings of the measured runs are written to"
+    )
+    args = parser.parse_args()
+
+    # The size of the Polars thread pool is read from POLARS_MAX_THREADS when polars is imported, the script
+    # restarts itself with the variable set
+    if args.threads is not None and os.environ.get("POLARS_MAX_THREADS") != str(args.threads):
+        os.environ["POLARS_MAX_THREADS"] = str(args.threads)
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+    timings = main(
+        scale_factor=args.scale,
+        query_numbers=parse_query_numbers(args.queries),
+        scan=not args.read,
+        concurrent=args.concurrent,
+        streaming=args.streaming,
+        profile=args.profile,
+        repetitions=args.repetitions,
+        warmup=args.warmup,
+    )
+    if args.timings_output:
+        with open(args.timings_output, "w") as f:
+            json.dump(timings, f)
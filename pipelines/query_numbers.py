@@ -0,0 +1,7 @@
+def parse_query_numbers(queries):
+    # e.g. "1-9", "4" or "1,3,5-7"
+    query_numbers = []
+    for query_range in queries.split(","):
+        first, _, last = query_range.partition("-")
+        query_numbers.extend(range(int(first), int(last or first) + 1))
+    return query_numbers
@@ -1,66 +1,130 @@
+from pyspark import StorageLevel
 from pyspark.sql import SparkSession
 from datetime import date, timedelta
 from pyspark.sql.functions import sum, col, avg, count, when, countDistinct
+from collections import Counter
 import argparse
+import json
 import os
-
-
-BUCKET = "windmill"
-
-
-def main(remote, scale, query_number):
-    with SparkSession.builder.getOrCreate() as spark:
-        if remote:
+import time
+
+
+# Root of the TPC-H datasets used with --remote true: a S3 bucket (s3://...) or a local directory. The S3 endpoint
+# can be overridden with S3_ENDPOINT_URL, for example to use MinIO
+STORAGE_ROOT = os.environ.get("TPC_H_STORAGE", "s3://windmill")
+QUERY_DATASETS = {
+    1: ["lineitem"],
+    2: ["customer", "orders", "lineitem"],
+    3: ["customer", "orders", "lineitem", "supplier", "nation", "region"],
+    4: ["lineitem"],
+    5: ["customer", "orders", "lineitem", "nation"],
+    6: ["orders", "lineitem"],
+    7: ["lineitem", "part"],
+    8: ["partsupp", "part", "supplier"],
+    9: ["customer", "orders", "lineitem"],
+}
+
+
+def main(
+    remote,
+    scale,
+    query_numbers,
+    cached_datasets,
+    storage_level,
+    threads=None,
+    memory_limit=None,
+    repetitions=1,
+    warmup=0,
+):
+    builder = SparkSession.builder
+    if threads is not None:
+        builder = builder.master("local[{}]".format(threads))
+    if memory_limit is not None:
+        # Only effective when the JVM is started by this script, spark-submit needs --driver-memory instead
+        builder = builder.config("spark.driver.memory", memory_limit)
+
+    with builder.getOrCreate() as spark:
+        if remote and STORAGE_ROOT.startswith("s3://"):
             connect_s3(spark)
 
-        match query_number:
-            case 1:
-                lineitem = load_dataset(spark, remote, scale, "lineitem")
-                output = query_1(lineitem)
-            case 2:
-                customer = load_dataset(spark, remote, scale, "customer")
-                orders = load_dataset(spark, remote, scale, "orders")
-                lineitem = load_dataset(spark, remote, scale, "lineitem")
-                output = query_2(customer, orders, lineitem)
-            case 3:
-                customer = load_dataset(spark, remote, scale, "customer")
-                orders = load_dataset(spark, remote, scale, "orders")
-                lineitem = load_dataset(spark, remote, scale, "lineitem")
-                supplier = load_dataset(spark, remote, scale, "supplier")
-                nation = load_dataset(spark, remote, scale, "nation")
-                region = load_dataset(spark, remote, scale, "region")
-                output = query_3(customer, orders, lineitem, supplier, nation, region)
-            case 4:
-                lineitem = load_dataset(spark, remote, scale, "lineitem")
-                output = query_4(lineitem)
-            case 5:
-                customer = load_dataset(spark, remote, scale, "customer")
-                orders = load_dataset(spark, remote, scale, "orders")
-                lineitem = load_dataset(spark, remote, scale, "lineitem")
-                nation = load_dataset(spark, remote, scale, "nation")
-                output = query_5(customer, orders, lineitem, nation)
-            case 6:
-                orders = load_dataset(spark, remote, scale, "orders")
-                lineitem = load_dataset(spark, remote, scale, "lineitem")
-                output = query_6(orders, lineitem)
-            case 7:
-                lineitem = load_dataset(spark, remote, scale, "lineitem")
-                part = load_dataset(spark, remote, scale, "part")
-                output = query_7(lineitem, part)
-            case 8:
-                partsupp = load_dataset(spark, remote, scale, "partsupp")
-                part = load_dataset(spark, remote, scale, "part")
-                supplier = load_dataset(spark, remote, scale, "supplier")
-                output = query_8(partsupp, part, supplier)
-            case 9:
-                customer = load_dataset(spark, remote, scale, "customer")
-                orders = load_dataset(spark, remote, scale, "orders")
-                lineitem = load_dataset(spark, remote, scale, "lineitem")
-                output = query_9(customer, orders, lineitem)
-
-        output.show()
-        if remote:
-            write_dataset(output, scale, query_number)
+        # Datasets are loaded once and shared by all the queries run in this session. The ones used by several
+        # of those queries and listed in cached_datasets are persisted after their first use.
+        dataset_usage = Counter(
+            dataset_name
+            for query_number in query_numbers
+            for dataset_name in QUERY_DATASETS[query_number]
+        )
+        datasets = {}
+        for dataset_name in dataset_usage:
+            dataset = load_dataset(spark, remote, scale, dataset_name)
+            if dataset_name in cached_datasets and dataset_usage[dataset_name] > 1:
+                dataset = dataset.persist(getattr(StorageLevel, storage_level))
+            datasets[dataset_name] = dataset
+
+        # The warmup runs are not measured. The work happens in the JVM, only the wall time is measured. Each run
+        # triggers a single action, the write of the output or its collection, the output is shown out of the timer.
+        timings = {}
+        for query_number in query_numbers:
+            query_timings = []
+            for repetition in range(warmup + repetitions):
+                start = time.perf_counter()
+                output = build_query(query_number, datasets)
+                if remote:
+                    write_dataset(output, remote, scale, query_number)
+                else:
+                    output.collect()
+                if repetition >= warmup:
+                    query_timings.append({"wall": time.perf_counter() - start})
+            output.show()
+            timings["query_{}".format(query_number)] = query_timings
+
+        for query_name, query_timings in timings.items():
+            for repetition_timings in query_timings:
+                print("{}: {:.3f}s".format(query_name, repetition_timings["wall"]))
+        return timings
+
+
+def build_query(query_number, datasets):
+    match query_number:
+        case 1:
+            return query_1(datasets["lineitem"])
+        case 2:
+            return query_2(datasets["customer"], datasets["orders"], datasets["lineitem"])
+        case 3:
+            return query_3(
+                datasets["customer"],
+                datasets["orders"],
+                datasets["lineitem"],
+                datasets["supplier"],
+                datasets["nation"],
+                datasets["region"],
+            )
+        case 4:
+            return query_4(datasets["lineitem"])
+        case 5:
+            return query_5(
+                datasets["customer"],
+                datasets["orders"],
+                datasets["lineitem"],
+                datasets["nation"],
+            )
+        case 6:
+            return query_6(datasets["orders"], datasets["lineitem"])
+        case 7:
+            return query_7(datasets["lineitem"], datasets["part"])
+        case 8:
+            return query_8(datasets["partsupp"], datasets["part"], datasets["supplier"])
+        case 9:
+            return query_9(datasets["customer"], datasets["orders"], datasets["lineitem"])
+
+
+def parse_query_numbers(queries):
+    # e.g. "1-9", "4" or "1,3,5-7"
+    query_numbers = []
+    for query_range in queries.split(","):
+        first, _, last = query_range.partition("-")
+        query_numbers.extend(range(int(first), int(last or first) + 1))
+    return query_numbers
 
 
 def connect_s3(spark):
@@ -70,25 +134,40 @@ def connect_s3(spark):
     spark._jsc.hadoopConfiguration().set(
         "fs.s3a.secret.key", os.environ.get("AWS_SECRET_KEY")
     )
-    spark._jsc.hadoopConfiguration().set(
-        "fs.s3a.endpoint",
-        "s3.us-east-2.amazonaws.com",  # change it to the URL of your S3 server
-    )
-
-
-def load_dataset(spark, remote, scale, dataset_name_or_path):
-    if remote:
-        dataset_path = "s3a://{}/tpc-h/{}/input/{}.parquet".format(
-            BUCKET, scale, dataset_name_or_path
+    if os.environ.get("S3_ENDPOINT_URL"):
+        # e.g. a local MinIO, which only supports path style URLs
+        spark._jsc.hadoopConfiguration().set(
+            "fs.s3a.endpoint", os.environ.get("S3_ENDPOINT_URL")
+        )
+        spark._jsc.hadoopConfiguration().set("fs.s3a.path.style.access", "true")
+        spark._jsc.hadoopConfiguration().set(
+            "fs.s3a.connection.ssl.enabled",
+            str(os.environ.get("S3_ENDPOINT_URL").startswith("https://")).lower(),
         )
     else:
-        dataset_path = "./data/{}.parquet".format(dataset_name_or_path)
+        spark._jsc.hadoopConfiguration().set(
+            "fs.s3a.endpoint",
+            "s3.us-east-2.amazonaws.com",  # change it to the URL of your S3 server
+        )
+
+
+def storage_root(remote):
+    if not remote:
+        return "./data"
+    # Hadoop accesses S3 through the s3a connector
+    return STORAGE_ROOT.replace("s3://", "s3a://", 1)
+
+
+def load_dataset(spark, remote, scale, dataset_name):
+    dataset_path = "{}/tpc-h/{}/raw/{}.parquet".format(
+        storage_root(remote), scale, dataset_name
+    )
     return spark.read.parquet(dataset_path)
 
 
-def write_dataset(dataset, scale, query_number):
-    output_path = "s3a://{}/tcp-h/{}/output-spark/query_{}.parquet".format(
-        BUCKET, scale, query_number
+def write_dataset(dataset, remote, scale, query_number):
+    output_path = "{}/tpc-h/{}/output-spark/query_{}.parquet".format(
+        storage_root(remote), scale, query_number
     )
     dataset.write.parquet(output_path, mode="overwrite")
 
@@ -499,6 +578,47 @@ if __name__ == "__main__":
     parser.add_argument("--remote", required=False, default="false", help="remote")
     parser.add_argument("--scale", required=False, default="1g", help="scale factor")
     parser.add_argument("--query", required=False, default="1", help="query number")
+    parser.add_argument(
+        "--queries",
+        required=False,
+        help="queries to run in the same session, e.g. 1-9 or 1,3,5 (overrides --query)",
+    )
+    parser.add_argument(
+        "--cache",
+        required=False,
+        default="lineitem,orders",
+        help="datasets to persist when they are used by several queries",
+    )
+    parser.add_argument(
+        "--storage-level",
+        required=False,
+        default="MEMORY_AND_DISK",
+        help="storage level of the persisted datasets",
+    )
+    parser.add_argument(
+        "--repetitions", type=int, default=1, help="measured runs of each query"
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=0, help="runs of each query before the measured ones"
+    )
+    parser.add_argument("--threads", type=int, help="cores used by Spark, local[threads]")
+    parser.add_argument("--memory-limit", help="memory of the Spark driver, e.g. 8g")
+    parser.add_argument(
+        "--timings-output", help="JSON file the timings of the measured runs are written to"
+    )
     args = parser.parse_args()
 
-    main(args.remote.lower() == "true", args.scale, int(args.query))
+    timings = main(
+        args.remote.lower() == "true",
+        args.scale,
+        parse_query_numbers(args.queries or args.query),
+        args.cache.split(",") if args.cache else [],
+        args.storage_level,
+        threads=args.threads,
+        memory_limit=args.memory_limit,
+        repetitions=args.repetitions,
+        warmup=args.warmup,
+    )
+    if args.timings_output:
+        with open(args.timings_output, "w") as f:
+            json.dump(timings, f)
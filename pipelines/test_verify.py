@@ -0,0 +1,21 @@
+import polars as pl
+import verify
+
+
+def test_int_and_float_columns_match():
+    duckdb_output = pl.DataFrame(
+        {"O_ORDERPRIORITY": ["1-URGENT", "2-HIGH"], "HIGH_LINE_COUNT": [6200.0, 6310.0]}
+    )
+    polars_output = pl.DataFrame(
+        {"o_orderpriority": ["2-HIGH", "1-URGENT"], "high_line_count": pl.Series([6310, 6200], dtype=pl.Int32)}
+    )
+    reference, output = verify.normalize(duckdb_output), verify.normalize(polars_output)
+    assert verify.column_hashes(reference, 2) == verify.column_hashes(output, 2)
+    assert verify.diff_rows(reference, output, 2, 1e-6) is None
+
+
+def test_different_values_differ():
+    reference = verify.normalize(pl.DataFrame({"count": [1, 2]}))
+    output = verify.normalize(pl.DataFrame({"count": [1.0, 3.0]}))
+    assert verify.column_hashes(reference, 2) != verify.column_hashes(output, 2)
+    assert verify.diff_rows(reference, output, 2, 1e-6) == "1 rows differ"
@@ -0,0 +1,178 @@
+import argparse
+import fsspec
+import os
+import polars as pl
+import s3fs
+import sys
+from query_numbers import parse_query_numbers
+
+# Same storage root as the pipelines: a S3 bucket (s3://...) or a local directory
+STORAGE_ROOT = os.environ.get("TPC_H_STORAGE", "s3://windmill")
+ENGINES = ["duckdb", "polars", "spark", "airflow"]
+# The engines do not name all the output columns the same way, the names are lower cased and then mapped with this
+COLUMN_ALIASES = {
+    "avg_quantity": "avg_qty",
+    "sum(l_quantity)": "sum_qty",
+}
+
+
+def main(engines, scale_factor, query_numbers, decimals, rtol):
+    fs = file_system()
+    reference_engine = engines[0]
+    mismatches = 0
+    for query_number in query_numbers:
+        reference = normalize(load_output(fs, reference_engine, scale_factor, query_number))
+        for engine in engines[1:]:
+            output = normalize(load_output(fs, engine, scale_factor, query_number))
+            # The hashes of the columns are compared first, the rows are only diffed when they differ. Floats are
+            # rounded before hashing, a different rounding of the same value is caught by the diff.
+            if column_hashes(reference, decimals) == column_hashes(output, decimals):
+                print("query_{}: {} matches {}".format(query_number, engine, reference_engine))
+                continue
+            differences = diff_rows(reference, output, decimals, rtol)
+            if differences is None:
+                print(
+                    "query_{}: {} matches {} within rtol={}".format(
+                        query_number, engine, reference_engine, rtol
+                    )
+                )
+                continue
+            mismatches += 1
+            print(
+                "query_{}: {} differs from {}: {}".format(
+                    query_number, engine, reference_engine, differences
+                )
+            )
+    return mismatches
+
+
+def load_output(fs, engine, scale_factor, query_number):
+    output_uri = "{}/tpc-h/{}/output-{}/query_{}.parquet".format(
+        STORAGE_ROOT, scale_factor, engine, query_number
+    )
+    # Spark writes a directory of part files
+    if fs.isdir(output_uri):
+        part_uris = sorted(fs.glob("{}/*.parquet".format(output_uri)))
+    else:
+        part_uris = [output_uri]
+    parts = []
+    for part_uri in part_uris:
+        with fs.open(part_uri, mode="rb") as part_file:
+            parts.append(pl.read_parquet(part_file))
+    return pl.concat(parts, how="vertical_relaxed")
+
+
+def normalize(dataset):
+    dataset = dataset.rename(
+        {
+            column: COLUMN_ALIASES.get(column.lower(), column.lower())
+            for column in dataset.columns
+        }
+    )
+    columns = []
+    for column, dtype in zip(dataset.columns, dataset.dtypes):
+        if dtype.is_numeric():
+            # the same column can be an integer in an engine and a float or a decimal in another one (e.g. the
+            # counts of query 6), all the numbers are compared as floats
+            columns.append(pl.col(column).cast(pl.Float64))
+        elif dtype == pl.Datetime:
+            # TPC-H only has dates, some engines read them as timestamps
+            columns.append(pl.col(column).cast(pl.Date))
+        elif dtype == pl.Utf8:
+            # CHAR(n) columns can be padded
+            columns.append(pl.col(column).str.strip_chars())
+        else:
+            columns.append(pl.col(column))
+    # the column order is not part of the answer
+    return dataset.select(columns).select(sorted(dataset.columns))
+
+
+def column_hashes(dataset, decimals):
+    # The sum of the hashes of the values is independent of the row order
+    hashes = {}
+    for column, dtype in zip(dataset.columns, dataset.dtypes):
+        values = dataset[column]
+        if dtype == pl.Float64:
+            # adding 0.0 turns -0.0 into 0.0
+            values = values.round(decimals) + 0.0
+        hashes[column] = (values.hash(seed=0) % (1 << 32)).cast(pl.Int64).sum()
+    return dataset.height, hashes
+
+
+def diff_rows(reference, output, decimals, rtol):
+    if reference.columns != output.columns:
+        return "columns {} != {}".format(reference.columns, output.columns)
+    if reference.height != output.height:
+        return "{} rows != {} rows".format(reference.height, output.height)
+
+    float_columns = [
+        column for column, dtype in zip(reference.columns, reference.dtypes) if dtype == pl.Float64
+    ]
+    other_columns = [column for column in reference.columns if column not in float_columns]
+    sort_keys = [pl.col(column) for column in other_columns] + [
+        pl.col(column).round(decimals) for column in float_columns
+    ]
+    reference = reference.sort(sort_keys)
+    output = output.sort(sort_keys)
+
+    different_rows = pl.Series([False] * reference.height)
+    for column in reference.columns:
+        expected, actual = reference[column], output[column]
+        if column in float_columns:
+            equal = ((expected - actual).abs() <= rtol * expected.abs()) | (
+                expected.is_null() & actual.is_null()
+            )
+            different_rows = different_rows | ~equal.fill_null(False)
+        else:
+            different_rows = different_rows | ~expected.eq_missing(actual)
+    if not different_rows.any():
+        return None
+
+    print(reference.filter(different_rows).head(5))
+    print(output.filter(different_rows).head(5))
+    return "{} rows differ".format(different_rows.sum())
+
+
+def file_system():
+    if not STORAGE_ROOT.startswith("s3://"):
+        return fsspec.filesystem("file")
+    return s3fs.S3FileSystem(
+        endpoint_url=os.environ.get("S3_ENDPOINT_URL"),
+        key=os.environ.get("AWS_ACCESS_KEY"),
+        secret=os.environ.get("AWS_SECRET_KEY"),
+        client_kwargs={"region_name": os.environ.get("AWS_REGION")},
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that the engines return the same results to the TPC-H queries"
+    )
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=ENGINES,
+        default=["duckdb", "polars"],
+        help="engines, the results of the first one are the reference",
+    )
+    parser.add_argument("--scale", default="1g", help="scale factor")
+    parser.add_argument("--queries", default="1-9", help="queries, e.g. 1-9 or 1,3,5")
+    parser.add_argument(
+        "--decimals", type=int, default=2, help="decimals of the floats that are hashed"
+    )
+    parser.add_argument(
+        "--rtol",
+        type=float,
+        default=1e-6,
+        help="relative tolerance on the floats when the rows are diffed",
+    )
+    args = parser.parse_args()
+
+    mismatches = main(
+        args.engines,
+        args.scale,
+        parse_query_numbers(args.queries),
+        args.decimals,
+        args.rtol,
+    )
+    sys.exit(1 if mismatches else 0)
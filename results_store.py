@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import json
+import math
+import os
+import socket
+import sqlite3
+import statistics
+import sys
+from datetime import datetime, timezone
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    imported_at TEXT NOT NULL,
+    source TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    version TEXT,
+    host TEXT NOT NULL,
+    label TEXT,
+    source_file TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    scale TEXT NOT NULL,
+    query TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_run_id ON samples (run_id);
+"""
+
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def import_file(conn, source, file_path, engine, version, host, label):
+    # The store is append only: each import is a new run, nothing is ever updated or deleted
+    match source:
+        case "tpc-h":
+            samples = tpc_h_samples(file_path)
+        case "benchmark-json":
+            samples = benchmark_json_samples(file_path)
+        case "kestra":
+            samples = kestra_samples(file_path)
+        case _:
+            raise ValueError(f"Unknown source {source}")
+    if not samples:
+        print(f"No samples found in {file_path}")
+        return None
+
+    # A TPC-H report contains several engines, one run is created per engine
+    run_ids = []
+    for run_engine in sorted(set(sample[0] or engine for sample in samples)):
+        cur = conn.execute(
+            "INSERT INTO runs (imported_at, source, engine, version, host, label, source_file) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                datetime.now(timezone.utc).isoformat(),
+                source,
+                run_engine,
+                version,
+                host,
+                label,
+                os.path.abspath(file_path),
+            ),
+        )
+        run_ids.append(cur.lastrowid)
+        conn.executemany(
+            "INSERT INTO samples (run_id, scale, query, metric, value) VALUES (?, ?, ?, ?, ?)",
+            [
+                (cur.lastrowid, scale, query, metric, value)
+                for sample_engine, scale, query, metric, value in samples
+                if (sample_engine or engine) == run_engine
+            ],
+        )
+    conn.commit()
+    return run_ids
+
+
+def tpc_h_samples(file_path):
+    # JSON report of pipelines/benchmark.py
+    with open(file_path) as f:
+        results = json.load(f)
+    samples = []
+    for result in results:
+        if result["exit_code"] != 0:
+            continue
+        key = (result["engine"], result["scale_factor"], f"query_{result['query']}")
+        samples.append((*key, "cold_wall_s", result["wall_s"]))
+        samples.append((*key, "cold_query_s", result["cold_query_s"]))
+        samples.append((*key, "peak_rss_mb", result["peak_rss_mb"]))
+        for warm_sample in result.get("warm_samples_s", []):
+            samples.append((*key, "warm_wall_s", warm_sample))
+    return samples
+
+
+def benchmark_json_samples(file_path):
+    # The timing JSON files of the orchestrators: {"python": [{...}]} for windmill and hatchet, and
+    # {"usecases": {<usecase>: {<language>: {...}}}} for temporal
+    with open(file_path) as f:
+        data = json.load(f)
+    if "usecases" in data:
+        benchmarks = [
+            (usecase, language, timings)
+            for usecase, usecase_data in data["usecases"].items()
+            for language, timings in usecase_data.items()
+            if isinstance(timings, dict)
+        ]
+    else:
+        usecase = os.path.splitext(os.path.basename(file_path))[0]
+        benchmarks = [
+            (usecase, language, timings)
+            for language, language_timings in data.items()
+            for timings in language_timings
+        ]
+
+    samples = []
+    for usecase, language, timings in benchmarks:
+        key = (None, f"{timings.get('workers', 1)} workers", f"{usecase}/{language}")
+        samples.extend(
+            task_samples(key, timings["created_at"], timings["started_at"], timings["completed_at"])
+        )
+    return samples
+
+
+def kestra_samples(file_path):
+    # <execution>.output.csv of competitors/kestra/generate_arrays.py
+    with open(file_path) as f:
+        rows = list(csv.DictReader(f))
+    key = (None, "1 workers", os.path.basename(file_path).split(".")[0])
+    samples = []
+    for row in rows:
+        samples.append((*key, "assignment_s", float(row["waiting_time"])))
+        samples.append((*key, "execution_s", float(row["execution_time"])))
+    return samples
+
+
+def task_samples(key, created_at, started_at, completed_at):
+    samples = [(*key, "total_s", max(completed_at))]
+    for created, started, completed in zip(created_at, started_at, completed_at):
+        samples.append((*key, "assignment_s", started - created))
+        samples.append((*key, "execution_s", completed - started))
+    return samples
+
+
+def compare(conn, baseline_run_id, run_id, alpha, threshold):
+    baseline = load_samples(conn, baseline_run_id)
+    current = load_samples(conn, run_id)
+
+    regressions = 0
+    print(f"| **Scale** | **Query** | **Metric** | **Run {baseline_run_id}** | **Run {run_id}** | **Change** | **p-value** | |")
+    print("| :-------- | :-------- | :--------- | ------: | ------: | ------: | ------: | :- |")
+    for key in sorted(baseline.keys() & current.keys()):
+        before, after = baseline[key], current[key]
+        change = statistics.mean(after) / statistics.mean(before) - 1 if statistics.mean(before) else 0.0
+        p_value = welch_t_test(before, after)
+        # A regression is slower by more than the threshold, and significant. Single samples can't be tested.
+        regression = p_value is not None and p_value < alpha and change > threshold
+        improvement = p_value is not None and p_value < alpha and change < -threshold
+        regressions += regression
+        print(
+            "| {} | {} | {} | {:.3f} | {:.3f} | {:+.1%} | {} | {} |".format(
+                *key,
+                statistics.mean(before),
+                statistics.mean(after),
+                change,
+                f"{p_value:.3f}" if p_value is not None else "n/a",
+                "**regression**" if regression else "improvement" if improvement else "",
+            )
+        )
+    print(f"\n{regressions} significant regression(s) over {threshold:.0%} (alpha={alpha})")
+    return regressions
+
+
+def load_samples(conn, run_id):
+    samples = {}
+    for scale, query, metric, value in conn.execute(
+        "SELECT scale, query, metric, value FROM samples WHERE run_id = ?", (run_id,)
+    ):
+        samples.setdefault((scale, query, metric), []).append(value)
+    return samples
+
+
+def welch_t_test(before, after):
+    # Two-sided p-value of the Welch t-test, for samples with unequal variances
+    if len(before) < 2 or len(after) < 2:
+        return None
+    variance_before = statistics.variance(before) / len(before)
+    variance_after = statistics.variance(after) / len(after)
+    if variance_before + variance_after == 0:
+        return 0.0 if statistics.mean(before) != statistics.mean(after) else 1.0
+    t = (statistics.mean(after) - statistics.mean(before)) / math.sqrt(variance_before + variance_after)
+    degrees_of_freedom = (variance_before + variance_after) ** 2 / (
+        variance_before**2 / (len(before) - 1) + variance_after**2 / (len(after) - 1)
+    )
+    # P(|T| > |t|) for a Student t distribution, with the regularized incomplete beta function
+    return incomplete_beta(degrees_of_freedom / 2, 0.5, degrees_of_freedom / (degrees_of_freedom + t**2))
+
+
+def incomplete_beta(a, b, x):
+    # Regularized incomplete beta function I_x(a, b), evaluated with its continued fraction (Numerical Recipes 6.4)
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    front = math.exp(
+        math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1 - x)
+    )
+    if x > (a + 1) / (a + b + 2):
+        return 1 - incomplete_beta(b, a, 1 - x)
+
+    tiny = 1e-30
+    c, d = 1.0, 1 - (a + b) * x / (a + 1)
+    d = 1 / (d if abs(d) > tiny else tiny)
+    fraction = d
+    for m in range(1, 200):
+        for numerator in (
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1)),
+        ):
+            d = 1 + numerator * d
+            d = 1 / (d if abs(d) > tiny else tiny)
+            c = 1 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            fraction *= c * d
+        if abs(c * d - 1) < 1e-12:
+            break
+    return front * fraction / a
+
+
+def list_runs(conn):
+    print("| **Run** | **Imported at** | **Source** | **Engine** | **Version** | **Host** | **Label** |")
+    print("| ------: | :-------------- | :--------- | :--------- | :---------- | :------- | :-------- |")
+    for row in conn.execute(
+        "SELECT run_id, imported_at, source, engine, version, host, label FROM runs ORDER BY run_id"
+    ):
+        print("| {} |".format(" | ".join("" if value is None else str(value) for value in row)))
+
+
+def previous_runs(conn):
+    # The last run and the previous one of the same source, engine and host
+    last = conn.execute(
+        "SELECT run_id, source, engine, host FROM runs ORDER BY run_id DESC LIMIT 1"
+    ).fetchone()
+    if last is None:
+        raise ValueError("The store is empty")
+    previous = conn.execute(
+        "SELECT run_id FROM runs WHERE source = ? AND engine = ? AND host = ? AND run_id < ? ORDER BY run_id DESC LIMIT 1",
+        last[1:] + (last[0],),
+    ).fetchone()
+    if previous is None:
+        raise ValueError(f"Run {last[0]} is the first run of {last[2]} on {last[3]}")
+    return previous[0], last[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Store benchmark results and compare runs")
+    parser.add_argument("--db", default="results.db", help="SQLite database of the results")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Import a result file as a new run")
+    import_parser.add_argument(
+        "source",
+        choices=["tpc-h", "benchmark-json", "kestra"],
+        help="tpc-h: report of pipelines/benchmark.py, benchmark-json: timing JSON of windmill, hatchet or temporal, "
+        "kestra: output CSV of generate_arrays.py",
+    )
+    import_parser.add_argument("file", help="Result file")
+    import_parser.add_argument(
+        "--engine", help="Engine of the run, e.g. windmill (the TPC-H reports contain it)"
+    )
+    import_parser.add_argument("--version", help="Version of the engine, e.g. 1.480.0")
+    import_parser.add_argument("--host", default=socket.gethostname(), help="Host the benchmark ran on")
+    import_parser.add_argument("--label", help="Free text describing the run")
+
+    subparsers.add_parser("list", help="List the runs")
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare two runs, the last two of the same engine by default"
+    )
+    compare_parser.add_argument("baseline_run_id", nargs="?", type=int, help="Baseline run")
+    compare_parser.add_argument("run_id", nargs="?", type=int, help="Run compared to the baseline")
+    compare_parser.add_argument("--alpha", type=float, default=0.05, help="Significance level")
+    compare_parser.add_argument(
+        "--threshold", type=float, default=0.05, help="Relative slowdown under which changes are ignored"
+    )
+
+    args = parser.parse_args()
+    conn = connect(args.db)
+
+    match args.command:
+        case "import":
+            if args.source != "tpc-h" and not args.engine:
+                parser.error("--engine is required for the orchestrator results")
+            run_ids = import_file(
+                conn, args.source, args.file, args.engine, args.version, args.host, args.label
+            )
+            if run_ids:
+                print(f"Imported {args.file} as run(s) {', '.join(str(run_id) for run_id in run_ids)}")
+        case "list":
+            list_runs(conn)
+        case "compare":
+            if args.baseline_run_id is None or args.run_id is None:
+                baseline_run_id, run_id = previous_runs(conn)
+            else:
+                baseline_run_id, run_id = args.baseline_run_id, args.run_id
+            # a non zero exit code lets a CI job fail on regressions
+            sys.exit(1 if compare(conn, baseline_run_id, run_id, args.alpha, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()